@@ -0,0 +1,335 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from buzzer import Buzzer, scaled
+from render import LedRenderer
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLedRenderer(LedRenderer):
+    """
+    LedRenderer driven by an asyncio task instead of its own thread.
+
+    play() stays callable from any thread; frames are paced with
+    asyncio sleeps so rendering never holds up the other tasks.
+    """
+
+    def __init__(self, pixels, cache_size=32, gamma=1.0):
+        super().__init__(pixels, cache_size, gamma)
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wake = None
+
+    def start(self):
+        pass  # run() is scheduled by AsyncRuntime
+
+    def stop(self, timeout=2):
+        with self._lock:
+            self._generation += 1
+            self._pending.clear()
+        self._notify()
+        self.off()
+
+    def play(self, name, *params, preempt=True):
+        with self._lock:
+            if preempt:
+                self._generation += 1
+                self._pending.clear()
+            self._pending.append((self._generation, name, params, time.perf_counter()))
+        self._notify()
+
+    def _notify(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                job = self._pending.popleft() if self._pending else None
+            if job is None:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+
+            generation, name, params, queued = job
+            if generation != self._generation:
+                continue  # Superseded while queued
+            try:
+                frames = self.cache.get(name, *params)
+                if self.observer is not None:
+                    self.observer(time.perf_counter() - queued)
+                await self._play_async(generation, frames)
+            except Exception as e:
+                logger.error(f"Animation error: {str(e)}")
+
+    async def _play_async(self, generation, frames):
+        for frame, wake_at in self.clock.plan(frames):
+            if generation != self._generation:
+                return
+            self._blit(frame)
+            if wake_at is None:
+                continue
+            while generation == self._generation:
+                remaining = wake_at - self.clock.now()
+                if remaining <= 0:
+                    break
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+
+class AsyncBuzzer(Buzzer):
+    """Buzzer driven by an asyncio task instead of its own thread; play() stays callable from any thread."""
+
+    def __init__(self, output, **kwargs):
+        super().__init__(output, **kwargs)
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wake = None
+
+    def start(self):
+        pass  # run() is scheduled by AsyncRuntime
+
+    def stop(self, timeout=2):
+        with self._lock:
+            self._generation += 1
+            self._pending.clear()
+        self._notify()
+        self._off()
+
+    def play(self, name, length=None, preempt=True):
+        steps = self.patterns[name]
+        if length:
+            steps = scaled(steps, length)
+        with self._lock:
+            if preempt:
+                self._generation += 1
+                self._pending.clear()
+            self._pending.append((self._generation, steps))
+        self._notify()
+
+    def _notify(self):
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                job = self._pending.popleft() if self._pending else None
+            if job is None:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            generation, steps = job
+            try:
+                await self._play_async(generation, steps)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Buzzer error: {str(e)}")
+            finally:
+                self._off()
+
+    async def _play_async(self, generation, steps):
+        for freq, on, off in steps:
+            if generation != self._generation:
+                self.preempted += 1
+                return
+            self._on(freq)
+            cut = await self._wait_async(generation, on)
+            self._off()
+            if cut or (off and await self._wait_async(generation, off)):
+                self.preempted += 1
+                return
+        self.played += 1
+
+    async def _wait_async(self, generation, seconds):
+        deadline = time.monotonic() + seconds
+        while generation == self._generation:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+class AsyncRuntime:
+    """
+    Runs a DeviceController's subsystems as tasks on one asyncio event loop.
+
+    NFC polling, tap handling, battery sampling, telemetry, the buzzer, LED
+    rendering, HTTP keep-alive and the offline queue are separate tasks.
+    Blocking driver calls go to the I2C worker threads (the controller's bus
+    arbiter keeps the PN532 and ADS1115 off the bus at the same time), tap
+    requests to a pool of their own and background HTTP/SQLite calls to a
+    small I/O pool, so a slow subsystem never stalls the others and a
+    drain or health check never makes a tap wait for a thread.
+    """
+
+    def __init__(self, controller, battery_interval=60, warning_voltage=3.3, io_workers=2):
+        self.controller = controller
+        self.battery_interval = battery_interval
+        self.warning_voltage = warning_voltage
+        # A worker per reader plus one, so a battery sample can queue behind NFC reads;
+        # the bus arbiter orders them
+        self.i2c_executor = ThreadPoolExecutor(
+            max_workers=len(controller.readers) + 1, thread_name_prefix="i2c"
+        )
+        # A tap request per reader can be in flight alongside another's confirmation
+        self.tap_executor = ThreadPoolExecutor(
+            max_workers=len(controller.readers) + 1, thread_name_prefix="tap"
+        )
+        self.io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+        self.loop = None
+        self._tap_tasks = set()
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.controller.runtime = self
+
+        c = self.controller
+        tasks = [
+            asyncio.create_task(c.renderer.run(), name="render"),
+            *(asyncio.create_task(self._poll_nfc(reader), name=f"nfc-{reader.name}")
+              for reader in c.readers),
+            asyncio.create_task(c.buzzer.run(), name="buzzer"),
+            asyncio.create_task(self._battery_sampler(), name="battery-sampler"),
+            asyncio.create_task(self._battery_monitor(), name="battery"),
+            asyncio.create_task(self._telemetry(), name="telemetry"),
+            asyncio.create_task(self._keepalive(), name="keepalive"),
+            asyncio.create_task(self._connectivity(), name="connectivity"),
+            asyncio.create_task(self._offline_queue(), name="offline-queue"),
+            asyncio.create_task(self._metrics(), name="metrics"),
+        ]
+        logger.info("Waiting for NFC cards (asyncio runtime)...")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks + list(self._tap_tasks):
+                task.cancel()
+            await asyncio.gather(*tasks, *self._tap_tasks, return_exceptions=True)
+            c.runtime = None
+            self.i2c_executor.shutdown(wait=False)
+            self.tap_executor.shutdown(wait=True)
+            self.io_executor.shutdown(wait=True)
+
+    def _i2c(self, func, *args, **kwargs):
+        return self.loop.run_in_executor(self.i2c_executor, functools.partial(func, *args, **kwargs))
+
+    def _tap(self, func, *args, **kwargs):
+        return self.loop.run_in_executor(self.tap_executor, functools.partial(func, *args, **kwargs))
+
+    def _io(self, func, *args, **kwargs):
+        return self.loop.run_in_executor(self.io_executor, functools.partial(func, *args, **kwargs))
+
+    async def _poll_nfc(self, reader):
+        detector = reader.detector
+        presence = reader.presence
+        while True:
+            interval = detector.next_interval()
+            if interval:
+                await asyncio.sleep(interval)
+            uid = await self._i2c(detector.read, reader.read_timeout)
+            if uid is None:
+                presence.absent()
+                continue
+            card_id = reader.card_id(uid)
+            if presence.observe(card_id):
+                logger.info("Card detected on %s: %s", reader.name, card_id)
+                self.controller.events.publish("card", reader.name, card_id=card_id)
+                task = asyncio.create_task(self._handle_tap(card_id, reader))
+                self._tap_tasks.add(task)
+                task.add_done_callback(self._tap_tasks.discard)
+
+    async def _handle_tap(self, card_uid, reader):
+        """DeviceController.handle_card_tap's stages, with the HTTP leg on the tap pool."""
+        c = self.controller
+        start, predicted = c._begin_tap(card_uid, reader)
+        if predicted is not None:
+            c._end_tap(start)
+            await self._tap(c._confirm_tap, card_uid, predicted, time.monotonic(), reader)
+        else:
+            await self._tap(c._tap_now, card_uid, reader)
+            c._end_tap(start)
+
+    async def _battery_sampler(self):
+        sampler = self.controller.battery
+        while True:
+            await asyncio.sleep(sampler.interval)
+            await self._i2c(sampler.sample)
+
+    async def _battery_monitor(self):
+        c = self.controller
+        while True:
+            voltage, percentage = c._read_battery()
+            if voltage is not None and voltage < self.warning_voltage:
+                c._low_battery_warning()
+            await asyncio.sleep(self.battery_interval)
+
+    async def _telemetry(self):
+        telemetry = self.controller.telemetry
+        while True:
+            await asyncio.sleep(telemetry.interval)
+            await self._io(telemetry.step)
+
+    async def _keepalive(self):
+        http = self.controller.http
+        await self._io(http.warm_up)
+        while True:
+            idle = http.idle()
+            if idle >= http.keepalive_interval:
+                await self._io(http.warm_up)
+                idle = 0
+            await asyncio.sleep(http.keepalive_interval - idle)
+
+    async def _connectivity(self):
+        monitor = self.controller.connectivity
+        while True:
+            if monitor.due():
+                await self._io(monitor.step)
+            await asyncio.sleep(monitor.probe_interval)
+
+    async def _metrics(self):
+        exporter = self.controller.metrics_exporter
+        if not exporter.path:
+            return
+        while True:
+            await asyncio.sleep(exporter.interval)
+            await self._io(exporter.write)
+
+    async def _offline_queue(self):
+        queue = self.controller.offline_queue
+        if not await self._io(queue.open):
+            return
+        wake = asyncio.Event()
+        queue.on_wake = lambda: self.loop.call_soon_threadsafe(wake.set)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), queue.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                wake.clear()
+                await self._io(queue.step)
+        finally:
+            queue.on_wake = None
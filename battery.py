@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Resting voltage -> charge for a 1S LiPo cell. The curve is flat between
+# roughly 3.75V and 3.95V, which is why a straight line over 3.0-4.2V jumps.
+LIPO_CURVE = (
+    (3.27, 0), (3.61, 5), (3.69, 10), (3.71, 15), (3.73, 20), (3.75, 25),
+    (3.77, 30), (3.79, 35), (3.80, 40), (3.82, 45), (3.84, 50), (3.85, 55),
+    (3.87, 60), (3.91, 65), (3.95, 70), (3.98, 75), (4.02, 80), (4.08, 85),
+    (4.11, 90), (4.15, 95), (4.20, 100),
+)
+
+
+def voltage_to_percentage(voltage, curve=LIPO_CURVE):
+    """Interpolate charge (0-100, float) from a resting voltage."""
+    volts = [v for v, _ in curve]
+    i = bisect_left(volts, voltage)
+    if i == 0:
+        return float(curve[0][1])
+    if i == len(curve):
+        return float(curve[-1][1])
+    (v0, p0), (v1, p1) = curve[i - 1], curve[i]
+    return p0 + (p1 - p0) * (voltage - v0) / (v1 - v0)
+
+
+class BatterySampler:
+    """
+    Filtered battery readings from an ADS1115 in continuous-conversion mode.
+
+    The ADC converts on its own, so a sample is a single register read.
+    Each sample is corrected for the voltage sag under the current load
+    (load() returns amps, e.g. from the LEDs that are lit), passed through a
+    short median filter to drop spikes and then an EMA. Callers use latest(),
+    which never touches the bus. A slow trend of the charge gives the
+    remaining-runtime estimate.
+    """
+
+    def __init__(self, ads, channel, curve=LIPO_CURVE, interval=2.0, data_rate=16,
+                 median=5, alpha=0.2, internal_resistance=0.15, load=None,
+                 trend_interval=60, trend_points=60):
+        from adafruit_ads1x15.ads1x15 import Mode
+
+        self.channel = channel
+        self.curve = curve
+        self.interval = interval
+        self.alpha = alpha
+        self.internal_resistance = internal_resistance
+        self.load = load
+        self.trend_interval = trend_interval
+        self.errors = 0
+        self.observer = None  # Called with each read duration, e.g. Histogram.observe
+        self.voltage = None
+        self.percentage = None
+        self._window = deque(maxlen=median)
+        self._trend = deque(maxlen=trend_points)
+        self._stop = threading.Event()
+        self._thread = None
+
+        ads.data_rate = data_rate
+        ads.mode = Mode.CONTINUOUS
+        if not self.sample():
+            raise RuntimeError("No reading from the battery ADC")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="battery-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Take one reading and update the filtered value. Returns False on a bus error."""
+        start = time.perf_counter()
+        try:
+            raw = self.channel.voltage
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Battery read error: {str(e)}")
+            return False
+        finally:
+            if self.observer is not None:
+                self.observer(time.perf_counter() - start)
+
+        if self.load is not None:
+            try:
+                raw += self.load() * self.internal_resistance
+            except Exception:
+                pass
+        self._window.append(raw)
+        median = sorted(self._window)[len(self._window) // 2]
+        if self.voltage is None:
+            self.voltage = median
+        else:
+            self.voltage += self.alpha * (median - self.voltage)
+        self.percentage = voltage_to_percentage(self.voltage, self.curve)
+
+        now = time.monotonic()
+        if not self._trend or now - self._trend[-1][0] >= self.trend_interval:
+            self._trend.append((now, self.percentage))
+        return True
+
+    def latest(self):
+        """Filtered (voltage, percentage), or (None, None) before the first good read."""
+        if self.voltage is None:
+            return None, None
+        return self.voltage, int(round(self.percentage))
+
+    def runtime_hours(self):
+        """Hours left at the recent discharge rate, or None while charging or too early to tell."""
+        points = list(self._trend)
+        if len(points) < 5:
+            return None
+        t0 = points[0][0]
+        xs = [(t - t0) / 3600 for t, _ in points]
+        ys = [p for _, p in points]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        var = sum((x - mean_x) ** 2 for x in xs)
+        if not var:
+            return None
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var
+        if slope >= 0:
+            return None
+        return round(self.percentage / -slope, 1)
+
+    def stats(self):
+        voltage, percentage = self.latest()
+        return {
+            "voltage": round(voltage, 3) if voltage is not None else None,
+            "percentage": percentage,
+            "runtime_hours": self.runtime_hours(),
+            "errors": self.errors,
+        }
@@ -0,0 +1,239 @@
+"""
+Simulated drivers for the hardware nfc.py talks to.
+
+install() registers stand-ins for board, busio, digitalio, neopixel,
+adafruit_pn532 and adafruit_ads1x15 in sys.modules, so nfc.py can be
+imported and driven on any machine. The fakes keep the real drivers'
+interfaces and rough timings, and expose hooks (FakePN532.present,
+FakeNeoPixel.frames) for benchmarks to drive and observe them.
+"""
+import sys
+import threading
+import time
+import types
+from collections import deque
+
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Pin({self.name})"
+
+
+class FakeI2C:
+    def __init__(self, scl=None, sda=None, frequency=100000):
+        self.frequency = frequency
+        self.lock = threading.Lock()
+
+    def try_lock(self):
+        return self.lock.acquire(blocking=False)
+
+    def unlock(self):
+        self.lock.release()
+
+
+class FakeSPI(FakeI2C):
+    def __init__(self, clock=None, MOSI=None, MISO=None):
+        super().__init__()
+
+
+class FakeDigitalInOut:
+    def __init__(self, pin):
+        self.pin = pin
+        self.toggles = 0
+        self._value = False
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        if value != self._value:
+            self.toggles += 1
+        self._value = value
+
+    def switch_to_output(self, value=False, drive_mode=None):
+        self._value = value
+
+    def switch_to_input(self, pull=None):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class FakeNeoPixel:
+    """
+    adafruit_pixelbuf-compatible ring: same byte order handling and buffer
+    attribute names, so LedRenderer can blit into it directly. show()
+    costs roughly what a WS2812 transmit of n pixels does (30us each).
+    """
+
+    def __init__(self, pin, n, *, bpp=3, brightness=1.0, auto_write=True,
+                 pixel_order="GRB", transmit_time=True):
+        self.n = n
+        self.byteorder = pixel_order
+        self._order = tuple(pixel_order.index(c) for c in "RGB")
+        self._pre_brightness_buffer = None
+        self._post_brightness_buffer = bytearray(3 * n)
+        self.auto_write = auto_write
+        self.transmit_time = 30e-6 * n if transmit_time else 0.0
+        self.shows = 0
+        self.last_show = 0.0
+        self.frames = deque(maxlen=4096)  # (monotonic time, bytes) per show()
+        self.record = False
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, index, color):
+        offset = 3 * index
+        for channel, position in enumerate(self._order):
+            self._post_brightness_buffer[offset + position] = color[channel]
+        if self.auto_write:
+            self.show()
+
+    def __getitem__(self, index):
+        offset = 3 * index
+        return tuple(self._post_brightness_buffer[offset + p] for p in self._order)
+
+    def fill(self, color):
+        auto_write, self.auto_write = self.auto_write, False
+        for i in range(self.n):
+            self[i] = color
+        self.auto_write = auto_write
+        if auto_write:
+            self.show()
+
+    def show(self):
+        if self.transmit_time:
+            end = time.perf_counter() + self.transmit_time
+            while time.perf_counter() < end:
+                pass
+        self.shows += 1
+        self.last_show = time.perf_counter()
+        if self.record:
+            self.frames.append((self.last_show, bytes(self._post_brightness_buffer)))
+
+    def deinit(self):
+        pass
+
+
+class FakePN532:
+    """
+    PN532 over I2C. Cards are placed with present(uid) and taken away with
+    remove(); read_passive_target returns the UID while one is present,
+    after read_time seconds, and otherwise waits out its timeout.
+    """
+
+    firmware_version = (0x32, 1, 6, 7)
+
+    def __init__(self, i2c=None, address=0x24, *, irq=None, reset=None, req=None,
+                 debug=False, read_time=0.004):
+        self.read_time = read_time
+        self.reads = 0
+        self.errors_to_raise = 0
+        self._card = None
+        self._arrived = threading.Event()
+        self._listening = False
+
+    def SAM_configuration(self):  # pylint: disable=invalid-name
+        pass
+
+    def present(self, uid):
+        self._card = bytes(uid)
+        self._arrived.set()
+
+    def remove(self):
+        self._card = None
+        self._arrived.clear()
+
+    def _check_error(self):
+        if self.errors_to_raise:
+            self.errors_to_raise -= 1
+            raise RuntimeError("Did not receive expected ACK from PN532!")
+
+    def read_passive_target(self, card_baud=0, timeout=1):
+        self.reads += 1
+        self._check_error()
+        if self._card is None and not self._arrived.wait(timeout):
+            return None
+        time.sleep(self.read_time)
+        return self._card
+
+    def listen_for_passive_target(self, card_baud=0, timeout=1):
+        self._check_error()
+        self._listening = True
+        return True
+
+    def get_passive_target(self, timeout=1):
+        self.reads += 1
+        self._listening = False
+        if self._card is None:
+            return None
+        time.sleep(self.read_time)
+        return self._card
+
+
+class FakeADS1115:
+    def __init__(self, i2c, gain=1, data_rate=None, mode=0x0100, address=0x48):
+        self.i2c = i2c
+        self.gain = gain
+        self.data_rate = data_rate or 128
+        self.mode = mode
+        self.voltage = 3.9
+        self.conversion_time = 1.0 / self.data_rate
+
+
+class FakeAnalogIn:
+    """Single-shot reads wait one conversion; continuous reads return at once."""
+
+    def __init__(self, ads, positive_pin, negative_pin=None):
+        self.ads = ads
+        self.reads = 0
+
+    @property
+    def voltage(self):
+        self.reads += 1
+        if self.ads.mode != Mode.CONTINUOUS:
+            time.sleep(self.ads.conversion_time)
+        return self.ads.voltage
+
+    @property
+    def value(self):
+        return int(self.voltage / 4.096 * 32767)
+
+
+class Mode:
+    CONTINUOUS = 0x0000
+    SINGLE = 0x0100
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install():
+    """Register the fakes in sys.modules. Call before importing nfc."""
+    pins = {name: Pin(name) for name in (
+        "D4", "D5", "D6", "D12", "D17", "D18", "D22", "D23", "D24", "D25", "D27",
+        "SCL", "SDA", "SCK", "MOSI", "MISO", "CE0", "CE1",
+    )}
+    _module("board", **pins)
+    _module("busio", I2C=FakeI2C, SPI=FakeSPI)
+    _module("digitalio", DigitalInOut=FakeDigitalInOut)
+    _module("neopixel", NeoPixel=FakeNeoPixel, GRB="GRB", RGB="RGB")
+    pn532 = _module("adafruit_pn532")
+    pn532.i2c = _module("adafruit_pn532.i2c", PN532_I2C=FakePN532)
+    pn532.spi = _module("adafruit_pn532.spi", PN532_SPI=FakePN532)
+    ads = _module("adafruit_ads1x15")
+    ads.ads1115 = _module("adafruit_ads1x15.ads1115", ADS1115=FakeADS1115, P0=0, P1=1,
+                          P2=2, P3=3, Mode=Mode)
+    ads.ads1x15 = _module("adafruit_ads1x15.ads1x15", Mode=Mode)
+    ads.analog_in = _module("adafruit_ads1x15.analog_in", AnalogIn=FakeAnalogIn)
@@ -0,0 +1,223 @@
+"""
+Load generator: many simulated devices tapping against a tap server.
+
+    python -m bench.load --spawn --devices 300 --rate 2 --duration 30
+    python -m bench.load --url http://127.0.0.1:8000 --devices 50 --rate 0
+
+Each device keeps one keep-alive connection and taps at random (Poisson)
+intervals averaging rate taps per second; rate 0 taps back-to-back to
+find the server's ceiling. Cards come from the server's /_cards index,
+with a share of unknown cards, and some taps carry a telemetry report as
+the firmware's do. --spawn starts a bench.tap_server in a subprocess
+(pass its options after --). Prints throughput, latency percentiles and
+failures by kind.
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 3)
+    return {"p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99),
+            "max_ms": round(samples[-1] * 1000, 3)}
+
+
+class Connection:
+    """A minimal HTTP/1.1 keep-alive client on asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method, path, payload=None):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload, separators=(",", ":")).encode() if payload is not None else b""
+        self._writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        length = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, await self._reader.readexactly(length) if length else b""
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class Device:
+    def __init__(self, name, host, port, cards, rng, rate, timeout, unknown_share, telemetry_share):
+        self.name = name
+        self.conn = Connection(host, port)
+        self.cards = cards
+        self.rng = rng
+        self.rate = rate
+        self.timeout = timeout
+        self.unknown_share = unknown_share
+        self.telemetry_share = telemetry_share
+        self.battery = rng.uniform(40, 100)
+
+    def _tap(self):
+        if self.rng.random() < self.unknown_share or not self.cards:
+            card = f"08{self.rng.getrandbits(24):06x}"
+        else:
+            # A few regulars tap far more often than everyone else
+            card = self.cards[min(len(self.cards) - 1, int(self.rng.paretovariate(1.2)) - 1)]
+        data = {"device": self.name, "card": card}
+        if self.rng.random() < self.telemetry_share:
+            self.battery = max(0.0, self.battery - 0.1)
+            data["telemetry"] = {"battery": int(self.battery), "voltage": round(3.3 + self.battery / 111, 3)}
+        return data
+
+    async def run(self, until, results):
+        while True:
+            if self.rate:
+                await asyncio.sleep(min(self.rng.expovariate(self.rate), max(0.0, until - time.monotonic())))
+            if time.monotonic() >= until:
+                break
+            start = time.perf_counter()
+            try:
+                status, body = await asyncio.wait_for(self.conn.request("POST", "/tap", self._tap()),
+                                                      self.timeout)
+            except asyncio.TimeoutError:
+                results.failures["timeout"] += 1
+                self.conn.close()
+                continue
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                results.failures["connection"] += 1
+                self.conn.close()
+                await asyncio.sleep(0.1)  # Back off before reconnecting
+                continue
+            if status != 200:
+                results.failures[f"http_{status}"] += 1
+                continue
+            results.latencies.append(time.perf_counter() - start)
+            results.card_types[json.loads(body).get("card_type", "?")] += 1
+        self.conn.close()
+
+
+class Results:
+    def __init__(self):
+        self.latencies = []
+        self.failures = Counter()
+        self.card_types = Counter()
+
+
+async def _cards(host, port, limit):
+    conn = Connection(host, port)
+    try:
+        cards = []
+        for card_type in ("access", "denied", "admin"):
+            status, body = await conn.request("GET", f"/_cards?type={card_type}&limit={limit}")
+            if status == 200:
+                cards.extend(json.loads(body))
+        return cards
+    finally:
+        conn.close()
+
+
+async def run_load(url, devices=100, rate=1.0, duration=10.0, timeout=5.0, unknown_share=0.05,
+                   telemetry_share=0.02, card_limit=2000, seed=0):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    rng = random.Random(seed)
+    cards = await _cards(host, port, card_limit)
+    rng.shuffle(cards)
+    results = Results()
+    fleet = [
+        Device(f"load-{i:04d}", host, port, cards, random.Random(rng.random()), rate, timeout,
+               unknown_share, telemetry_share)
+        for i in range(devices)
+    ]
+    start = time.monotonic()
+    until = start + duration
+    await asyncio.gather(*(device.run(until, results) for device in fleet))
+    elapsed = time.monotonic() - start
+
+    completed = len(results.latencies)
+    return {
+        "devices": devices,
+        "rate_per_device": rate,
+        "duration_s": round(elapsed, 2),
+        "taps": completed,
+        "taps_per_s": round(completed / elapsed, 1),
+        "latency": percentiles(results.latencies),
+        "failures": dict(results.failures),
+        "card_types": dict(results.card_types),
+    }
+
+
+def _spawn(server_args):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen([sys.executable, "-m", "bench.tap_server", "--port", str(port)] + server_args)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError("tap server did not start")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start a bench.tap_server to test against")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0, help="taps per second per device (0 = flat out)")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--unknown-share", type=float, default=0.05)
+    parser.add_argument("--telemetry-share", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", metavar="JSON", help="also write the results here")
+    parser.add_argument("server_args", nargs="*", help="options for the spawned server, after --")
+    args = parser.parse_args(argv)
+
+    proc = None
+    url = args.url
+    if args.spawn:
+        proc, url = _spawn(args.server_args)
+    try:
+        results = asyncio.run(run_load(
+            url, args.devices, args.rate, args.duration, args.timeout,
+            args.unknown_share, args.telemetry_share, seed=args.seed,
+        ))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Benchmarks for the tap and render hot paths, on simulated hardware.
+
+    python -m bench.run --label before
+    python -m bench.run --label after --compare bench/results/before.json
+
+Results are written to bench/results/<label>.json. Timings depend on the
+machine, so compare runs made on the same host.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+import tracemalloc
+
+from bench import fakehw
+
+fakehw.install()
+
+import nfc  # noqa: E402  (needs the fakes in place)
+from detect import PollingDetector  # noqa: E402
+from render import LedRenderer  # noqa: E402
+from bench.tap_server import PROGRAMS, CardStore, Faults, ServerThread, TapServer  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+ANIMATIONS = (
+    ("solid", ("000255000", 500, 100)),
+    ("spin", ("000000255", 500, 80)),
+    ("split", ("255000000", 500, 100)),
+    ("rainbow", ("", 1000, 60)),
+    ("battery", (55, 100)),
+)
+# What the tap benchmark's cards are answered with: one of each animation, and a program
+TAP_MIX = (
+    {"color": "000255000", "duration": 300, "animation": "solid", "brightness": 100},
+    {"color": "000000255", "duration": 500, "animation": "spin", "brightness": 80},
+    {"color": "255000000", "duration": 400, "animation": "split", "brightness": 100},
+    {"color": "000000000", "duration": 800, "animation": "rainbow", "brightness": 60,
+     "program": next(iter(PROGRAMS))},
+)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 3)
+    return {"p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99),
+            "max_ms": round(samples[-1] * 1000, 3)}
+
+
+def bench_render(frames_per_anim=2000):
+    """Compile cost, raw blit rate, real playback rate and allocations per frame."""
+    results = {}
+    for name, params in ANIMATIONS:
+        pixels = fakehw.FakeNeoPixel(None, 24, auto_write=False, transmit_time=False)
+        renderer = LedRenderer(pixels)
+
+        start = time.perf_counter()
+        frames = renderer.cache.get(name, *params)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        buffers = [frame for frame, _ in frames]
+        count = 0
+        start = time.perf_counter()
+        while count < frames_per_anim:
+            for frame in buffers:
+                renderer._blit(frame)
+            count += len(buffers)
+        blit_fps = count / (time.perf_counter() - start)
+
+        sample = buffers[:200]
+        transient = _transient_bytes(renderer._blit, sample) - _transient_bytes(len, sample)
+
+        # Real-time playback on the render thread
+        pixels.transmit_time = 30e-6 * 24
+        renderer.start()
+        played = renderer.frames_shown + renderer.frames_skipped
+        start = time.perf_counter()
+        renderer.play(name, *params)
+        expected = sum(hold for _, hold in frames)
+        time.sleep(expected + 0.1)
+        played = renderer.frames_shown + renderer.frames_skipped - played
+        renderer.stop()
+
+        results[name] = {
+            "frames": len(frames),
+            "compile_ms": round(compile_ms, 3),
+            "blit_fps": round(blit_fps),
+            "played_fps": round(played / expected, 1) if expected else None,
+            "target_fps": renderer.clock.target_fps,
+            "dropped": renderer.clock.dropped,
+            "jitter_p99_ms": renderer.clock.jitter().get("p99_ms"),
+            "alloc_bytes_per_frame": round(max(0, transient) / len(sample), 1),
+        }
+    return results
+
+
+def _transient_bytes(func, frames):
+    """Peak bytes allocated while func(frame) runs, summed over frames."""
+    tracemalloc.start()
+    total = 0
+    for frame in frames:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        func(frame)
+        total += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return total
+
+
+def _controller(server_url, workdir):
+    nfc.CONFIG.update({
+        'SERVER_URL': server_url,
+        'OFFLINE_QUEUE_PATH': os.path.join(workdir, 'offline.db'),
+        'PROGRAM_DIR': os.path.join(workdir, 'programs'),
+        'METRICS_FILE': None,
+        'METRICS_PORT': None,
+    })
+    controller = nfc.DeviceController()
+    time.sleep(3)  # Let the startup animations finish
+    return controller
+
+
+def _wait_for_show(pixels, shows, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while pixels.shows == shows and time.perf_counter() < deadline:
+        time.sleep(0.0002)
+    return pixels.last_show
+
+
+def _tap_server(cards, delay):
+    """A bench.tap_server in this process, knowing cards, answering after delay seconds."""
+    store = CardStore()
+    for card in cards:
+        store.add(card, "access", **TAP_MIX[zlib.crc32(card.encode()) % len(TAP_MIX)])
+    return ServerThread(TapServer(store, Faults(latency=delay), port=0)).start()
+
+
+def bench_taps(taps=60, server_delay=0.01):
+    """Taps/sec, tap-to-light latency and CPU per tap through DeviceController.handle_card_tap."""
+    scenarios = (
+        ("new_cards", [f"{i:08x}" for i in range(taps)]),
+        ("repeat_cards", [f"{i % 4:08x}" for i in range(taps)]),
+    )
+    server = _tap_server({card for _, cards in scenarios for card in cards}, server_delay)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        controller = _controller(server.url, workdir)
+        try:
+            for scenario, cards in scenarios:
+                latencies = []
+                cpu = time.process_time()
+                start = time.perf_counter()
+                for card in cards:
+                    shows = controller.pixels.shows
+                    t0 = time.perf_counter()
+                    controller.handle_card_tap(card)
+                    latencies.append(_wait_for_show(controller.pixels, shows) - t0)
+                elapsed = time.perf_counter() - start
+                results[scenario] = {
+                    "taps_per_s": round(len(cards) / elapsed, 2),
+                    "cpu_ms_per_tap": round((time.process_time() - cpu) / len(cards) * 1000, 3),
+                    "tap_to_light": percentiles(latencies),
+                }
+        finally:
+            controller.cleanup()
+            server.stop()
+    return results
+
+
+def bench_detect(cards=40):
+    """Time from a card landing on the (simulated) reader to its UID coming back."""
+    reader = fakehw.FakePN532()
+    detector = PollingDetector(reader, min_interval=nfc.CONFIG['POLL_MIN_INTERVAL'],
+                               max_interval=nfc.CONFIG['POLL_MAX_INTERVAL'])
+    latencies = []
+    rng = random.Random(1)
+    for i in range(cards):
+        placed = {}
+
+        def place():
+            time.sleep(rng.uniform(0.05, 0.4))
+            placed["at"] = time.perf_counter()
+            reader.present(i.to_bytes(4, "big"))
+
+        threading.Thread(target=place).start()
+        while detector.wait_for_card(timeout=0.5) is None:
+            pass
+        latencies.append(time.perf_counter() - placed["at"])
+        reader.remove()
+    return {"mode": detector.mode, "reads": reader.reads, "latency": percentiles(latencies)}
+
+
+def _flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(old, new):
+    old_flat, new_flat = _flatten(old), _flatten(new)
+    print(f"{'metric':55} {'before':>12} {'after':>12} {'change':>9}")
+    for key in sorted(set(old_flat) | set(new_flat)):
+        if key.startswith("meta."):
+            continue
+        a, b = old_flat.get(key), new_flat.get(key)
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+        print(f"{key:55} {a if a is not None else '-':>12} {b if b is not None else '-':>12} {change:>9}")
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--label", default=time.strftime("%Y%m%d-%H%M%S"))
+    parser.add_argument("--only", choices=("render", "taps", "detect"), action="append")
+    parser.add_argument("--taps", type=int, default=60)
+    parser.add_argument("--server-delay", type=float, default=0.01)
+    parser.add_argument("--compare", metavar="RESULTS_JSON")
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    suites = args.only or ["render", "taps", "detect"]
+    results = {"meta": {
+        "label": args.label,
+        "git": _git_rev(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+    }}
+    if "render" in suites:
+        results["render"] = bench_render()
+    if "taps" in suites:
+        results["taps"] = bench_taps(args.taps, args.server_delay)
+    if "detect" in suites:
+        results["detect"] = bench_detect()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{args.label}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Saved {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
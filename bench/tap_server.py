@@ -0,0 +1,432 @@
+"""
+Reference tap server for load and soak tests.
+
+    python -m bench.tap_server --port 8000 --cards 50000
+    python -m bench.tap_server --latency 0.02 --jitter 0.03 --error-rate 0.01
+
+Implements the device API (/tap, /tap/bulk, /telemetry, /battery/<pct>,
+/animations/<hash> and HEAD keep-alives) with the production response
+fields, on plain asyncio streams with HTTP/1.1 keep-alive; standard
+library only. Cards live in an in-memory store indexed by UID and by card
+type, and each card's response is encoded once, so a tap costs a dict
+lookup. Latency and faults can be set on the command line or changed
+while running:
+
+    curl -X POST localhost:8000/_faults -d '{"error_rate": 0.2, "path": "/tap"}'
+    curl localhost:8000/_stats
+    curl 'localhost:8000/_cards?type=access&limit=100'
+
+ServerThread runs one inside another process, as bench.run does.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Keyframe programs (see programs.py) served by hash; some generated cards refer to one
+PULSE = json.dumps({"fps": 40, "keyframes": [
+    [0, ["000000000"]], [300, ["000255120", "000000000"], 6], [600, ["000000000"], 12]
+]}, separators=(",", ":")).encode()
+PROGRAMS = {hashlib.sha256(PULSE).hexdigest(): PULSE}
+
+# Responses by card type, as the production server sends them
+PROFILES = {
+    "access": {"color": "000255000", "duration": 300, "animation": "solid", "brightness": 100,
+               "tapSound": True, "statusSound": False, "soundDuration": 0.01},
+    "admin": {"color": "000000255", "duration": 500, "animation": "spin", "brightness": 80,
+              "tapSound": True, "statusSound": True, "soundDuration": 0.05},
+    "denied": {"color": "255000000", "duration": 400, "animation": "split", "brightness": 100,
+               "tapSound": True, "statusSound": True, "soundDuration": 0.2},
+}
+UNKNOWN = {"color": "255000000", "duration": 600, "animation": "split", "brightness": 100,
+           "card_type": "unknown", "tapSound": True, "statusSound": True, "soundDuration": 0.3}
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+def _json(payload):
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+class Card:
+    __slots__ = ("uid", "card_type", "body", "taps", "last_device", "last_tap")
+
+    def __init__(self, uid, card_type, response):
+        self.uid = uid
+        self.card_type = card_type
+        self.body = _json(response)  # Encoded once; every tap sends the same bytes
+        self.taps = 0
+        self.last_device = None
+        self.last_tap = None
+
+
+class CardStore:
+    """Cards indexed by UID and by type, plus what each device last reported."""
+
+    def __init__(self):
+        self._cards = {}
+        self._by_type = defaultdict(list)
+        self.devices = defaultdict(lambda: {"taps": 0, "bulk_taps": 0, "battery": None,
+                                            "telemetry": None, "last_seen": None})
+        self.unknown_taps = 0
+        self._unknown_body = _json(UNKNOWN)
+
+    def __len__(self):
+        return len(self._cards)
+
+    def add(self, uid, card_type="access", **overrides):
+        response = dict(PROFILES.get(card_type, PROFILES["access"]), card_type=card_type, **overrides)
+        card = Card(uid.lower(), card_type, response)
+        if card.uid in self._cards:
+            self._by_type[self._cards[card.uid].card_type].remove(card.uid)
+        self._cards[card.uid] = card
+        self._by_type[card_type].append(card.uid)
+        return card
+
+    def get(self, uid):
+        return self._cards.get(uid.lower())
+
+    def of_type(self, card_type, limit=None):
+        uids = self._by_type.get(card_type, [])
+        return uids[:limit] if limit is not None else list(uids)
+
+    def generate(self, count, seed=0, admin_share=0.01, denied_share=0.1, program_share=0.05):
+        """Add count random 7-byte UIDs with a realistic mix of card types."""
+        rng = random.Random(seed)
+        programs = list(PROGRAMS)
+        for _ in range(count):
+            uid = f"04{rng.getrandbits(48):012x}"
+            roll = rng.random()
+            if roll < admin_share:
+                self.add(uid, "admin")
+            elif roll < admin_share + denied_share:
+                self.add(uid, "denied")
+            elif programs and roll < admin_share + denied_share + program_share:
+                self.add(uid, "access", program=rng.choice(programs))
+            else:
+                self.add(uid, "access")
+
+    def load(self, path):
+        """Add cards from a JSON list of {"uid", "card_type", ...response overrides}."""
+        with open(path) as f:
+            for entry in json.load(f):
+                entry = dict(entry)
+                self.add(entry.pop("uid"), entry.pop("card_type", "access"), **entry)
+
+    def tap(self, device, uid, now):
+        """Record a tap and return the encoded response."""
+        state = self.devices[device]
+        state["taps"] += 1
+        state["last_seen"] = now
+        card = self._cards.get(uid)
+        if card is None:
+            self.unknown_taps += 1
+            return self._unknown_body
+        card.taps += 1
+        card.last_device = device
+        card.last_tap = now
+        return card.body
+
+    def stats(self):
+        return {
+            "cards": len(self._cards),
+            "by_type": {t: len(uids) for t, uids in self._by_type.items()},
+            "devices": len(self.devices),
+            "unknown_taps": self.unknown_taps,
+        }
+
+
+class Faults:
+    """
+    Injected latency and failures, per request to paths starting with path.
+
+    Each request waits latency plus up to jitter seconds, then fails with
+    a 503 (error_rate), has its connection dropped without an answer
+    (drop_rate) or hangs for hang seconds before answering (hang_rate).
+    """
+
+    FIELDS = ("latency", "jitter", "error_rate", "drop_rate", "hang_rate", "hang", "path")
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, drop_rate=0.0, hang_rate=0.0,
+                 hang=10.0, path="/", seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.hang_rate = hang_rate
+        self.hang = hang
+        self.path = path
+        self._rng = random.Random(seed)
+
+    def update(self, settings):
+        for name, value in settings.items():
+            if name not in self.FIELDS:
+                raise ValueError(f"unknown fault setting: {name}")
+            setattr(self, name, str(value) if name == "path" else float(value))
+
+    def settings(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    async def apply(self, path):
+        """Delay as configured; returns None, "error", "drop" or "hang"."""
+        if not path.startswith(self.path):
+            return None
+        delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        roll = self._rng.random()
+        if roll < self.error_rate:
+            return "error"
+        roll -= self.error_rate
+        if roll < self.drop_rate:
+            return "drop"
+        roll -= self.drop_rate
+        if roll < self.hang_rate:
+            await asyncio.sleep(self.hang)
+            return "hang"
+        return None
+
+
+class TapServer:
+    def __init__(self, store, faults=None, host="127.0.0.1", port=8000):
+        self.store = store
+        self.faults = faults or Faults()
+        self.host = host
+        self.port = port
+        self.requests = Counter()  # by path group
+        self.statuses = Counter()
+        self.injected = Counter()
+        self.connections = 0
+        self.started = time.monotonic()
+        self._server = None
+        self._writers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, backlog=1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.started = time.monotonic()
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        """Stop listening and drop open connections, as a server going away would."""
+        if self._server is not None:
+            self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return  # Client closed the connection
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                response = await self._respond(method, target, body)
+                if response is None:
+                    return  # Injected drop
+                status, payload, content_type = response
+                self.statuses[status] += 1
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.debug(f"Connection error: {str(e)}")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path
+        group = "/" + path.split("/")[1]
+        if path.startswith("/tap/bulk"):
+            group = "/tap/bulk"
+        self.requests[group] += 1
+
+        if not path.startswith("/_"):
+            fault = await self.faults.apply(path)
+            if fault is not None:
+                self.injected[fault] += 1
+                if fault == "drop":
+                    return None
+                if fault == "error":
+                    return 503, _json({"error": "injected fault"}), "application/json"
+
+        if method == "HEAD":
+            return 200, b"", "application/json"
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, _json({"error": "invalid JSON"}), "application/json"
+        now = time.time()
+
+        if method == "POST" and path == "/tap":
+            device = str(data.get("device", "unknown"))
+            if data.get("telemetry") is not None:
+                self.store.devices[device]["telemetry"] = data["telemetry"]
+            return 200, self.store.tap(device, str(data.get("card", "")).lower(), now), "application/json"
+        if method == "POST" and path == "/tap/bulk":
+            taps = data.get("taps", [])
+            state = self.store.devices[str(data.get("device", "unknown"))]
+            state["bulk_taps"] += len(taps)
+            state["last_seen"] = now
+            return 200, _json({"accepted": len(taps)}), "application/json"
+        if method == "POST" and path == "/telemetry":
+            state = self.store.devices[str(data.get("device", "unknown"))]
+            state["telemetry"] = data.get("telemetry")
+            state["last_seen"] = now
+            return 200, _json({"ok": True}), "application/json"
+        if method == "GET" and path.startswith("/battery/"):
+            # Legacy firmware reports the battery here, without a device name
+            self.store.devices["unknown"]["battery"] = path.rsplit("/", 1)[-1]
+            return 200, _json({"ok": True}), "application/json"
+        if method == "GET" and path.startswith("/animations/"):
+            program = PROGRAMS.get(path.rsplit("/", 1)[-1])
+            if program is None:
+                return 404, _json({"error": "not found"}), "application/json"
+            return 200, program, "application/json"
+        if method == "GET" and path == "/_stats":
+            return 200, _json(self.stats()), "application/json"
+        if method == "GET" and path == "/_cards":
+            query = parse_qs(url.query)
+            limit = int(query.get("limit", ["1000"])[0])
+            return 200, _json(self.store.of_type(query.get("type", ["access"])[0], limit)), "application/json"
+        if method == "POST" and path == "/_faults":
+            try:
+                self.faults.update(data)
+            except (ValueError, TypeError) as e:
+                return 400, _json({"error": str(e)}), "application/json"
+            logger.info(f"Faults now {self.faults.settings()}")
+            return 200, _json(self.faults.settings()), "application/json"
+        return 404, _json({"error": "not found"}), "application/json"
+
+    def stats(self):
+        uptime = time.monotonic() - self.started
+        taps = self.requests["/tap"]
+        return {
+            "uptime_s": round(uptime, 1),
+            "connections": self.connections,
+            "requests": dict(self.requests),
+            "statuses": {str(k): v for k, v in self.statuses.items()},
+            "taps_per_s": round(taps / uptime, 1) if uptime else 0.0,
+            "injected": dict(self.injected),
+            "faults": self.faults.settings(),
+            "store": self.store.stats(),
+        }
+
+
+class ServerThread:
+    """A TapServer on an event loop in its own thread, for driving the firmware from the same process."""
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = None
+        self._thread = None
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.server.start())
+            ready.set()
+            self.loop.run_forever()
+            self.server.close()
+            # Let the connections see their end; a request stuck in an injected hang is abandoned
+            tasks = asyncio.all_tasks(self.loop)
+            if tasks:
+                self.loop.run_until_complete(asyncio.wait(tasks, timeout=1))
+            self.loop.close()
+
+        self._thread = threading.Thread(target=run, name="tap-server")
+        self._thread.daemon = True
+        self._thread.start()
+        ready.wait()
+        return self
+
+    @property
+    def url(self):
+        return self.server.url
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+async def _main(args):
+    store = CardStore()
+    if args.cards_file:
+        store.load(args.cards_file)
+    store.generate(args.cards, seed=args.seed)
+    faults = Faults(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    drop_rate=args.drop_rate, hang_rate=args.hang_rate, hang=args.hang,
+                    path=args.fault_path, seed=args.seed)
+    server = await TapServer(store, faults, args.host, args.port).start()
+    logger.info(f"Serving {len(store)} cards on {server.url}")
+    try:
+        await server.serve_forever()
+    finally:
+        logger.info(f"Stats: {server.stats()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cards", type=int, default=10000, help="random cards to generate")
+    parser.add_argument("--cards-file", help="JSON list of cards to load first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--hang", type=float, default=10.0)
+    parser.add_argument("--fault-path", default="/", help="only inject into paths with this prefix")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
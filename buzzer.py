@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Steps are (frequency in Hz, seconds on, seconds off). The frequency only
+# matters on a PWM-driven (passive) buzzer; an active buzzer on a plain GPIO
+# plays its own tone for the on time.
+PATTERNS = {
+    "tap": ((2700, 0.1, 0.0),),
+    "success": ((2700, 0.06, 0.04), (3300, 0.1, 0.0)),
+    "deny": ((900, 0.15, 0.08), (650, 0.3, 0.0)),
+    "low_battery": ((1800, 0.08, 0.12), (1800, 0.08, 0.12), (1800, 0.08, 0.0)),
+}
+
+
+def scaled(steps, length):
+    """The steps with the longest tone lasting length seconds and the rest in proportion."""
+    longest = max(on for _, on, _ in steps)
+    if not length or not longest:
+        return steps
+    return tuple((freq, on * length / longest, off) for freq, on, off in steps)
+
+
+class Buzzer:
+    """
+    Plays buzzer patterns on its own thread.
+
+    play() queues a pattern and returns at once. A preempting pattern cuts
+    off whatever is sounding and discards anything still queued, as with
+    LedRenderer.play(). output is a DigitalInOut (toggled on and off) or a
+    PWMOut with variable_frequency (each step sets the tone).
+    """
+
+    def __init__(self, output, patterns=PATTERNS):
+        self.output = output
+        self.patterns = patterns
+        self.pwm = hasattr(output, "duty_cycle")
+        self.played = 0
+        self.preempted = 0
+        self.errors = 0
+        self._jobs = queue.Queue()
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="buzzer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        with self._cond:
+            self._generation += 1
+            self._drain()
+            self._cond.notify_all()
+        self._jobs.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._off()
+
+    def play(self, name, length=None, preempt=True):
+        """Queue a pattern from PATTERNS, optionally scaled to length (see scaled()). Returns immediately."""
+        steps = self.patterns[name]
+        if length:
+            steps = scaled(steps, length)
+        with self._cond:
+            if preempt:
+                self._generation += 1
+                self._drain()
+                self._cond.notify_all()
+            self._jobs.put((self._generation, steps))
+
+    def _drain(self):
+        try:
+            while True:
+                self._jobs.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            generation, steps = job
+            try:
+                self._play(generation, steps)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Buzzer error: {str(e)}")
+            finally:
+                self._off()
+
+    def _play(self, generation, steps):
+        for freq, on, off in steps:
+            if generation != self._generation:
+                self.preempted += 1
+                return
+            self._on(freq)
+            cut = self._wait(generation, on)
+            self._off()
+            if cut or (off and self._wait(generation, off)):
+                self.preempted += 1
+                return
+        self.played += 1
+
+    def _wait(self, generation, seconds):
+        """Sleep for seconds unless preempted first. Returns True if preempted."""
+        deadline = time.monotonic() + seconds
+        with self._cond:
+            while generation == self._generation:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _on(self, freq):
+        if self.pwm:
+            self.output.frequency = freq
+            self.output.duty_cycle = 0x8000  # Square wave
+        else:
+            self.output.value = True
+
+    def _off(self):
+        try:
+            if self.pwm:
+                self.output.duty_cycle = 0
+            else:
+                self.output.value = False
+        except Exception as e:
+            logger.error(f"Buzzer error: {str(e)}")
+
+    def stats(self):
+        return {"played": self.played, "preempted": self.preempted, "errors": self.errors}
+
+
+def make_output(pin, pwm=False):
+    """A PWMOut for a passive buzzer on a PWM-capable pin, else a plain GPIO output."""
+    if pwm:
+        import pwmio
+        return pwmio.PWMOut(pin, frequency=2700, duty_cycle=0, variable_frequency=True)
+    from digitalio import DigitalInOut
+    output = DigitalInOut(pin)
+    output.switch_to_output(value=False)
+    return output
@@ -0,0 +1,220 @@
+import logging
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RequestException):
+    """Raised instead of sending a request while the circuit is open."""
+
+
+def is_outage(error):
+    """True if a failed request means the server is unreachable or broken (not a 4xx answer)."""
+    response = getattr(error, "response", None)
+    return response is None or response.status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the tap server is down.
+
+    Closed: requests go through; failure_threshold outage failures in a
+    row open the circuit. Open: allow() refuses everything for
+    reset_timeout seconds. Half-open: one trial request is let through;
+    success closes the circuit, failure opens it again. Listeners are
+    called with the new state on every change.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=2, reset_timeout=5.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.listeners = []
+        self._opened_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a request may be sent now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            self.rejected += 1
+            return False
+
+    @contextmanager
+    def guard(self):
+        """
+        Wrap one request: raises CircuitOpenError if it may not be sent,
+        and records whether it went through.
+        """
+        if not self.allow():
+            raise CircuitOpenError("tap server unreachable, circuit open")
+        try:
+            yield
+        except RequestException as e:
+            self.record(e)
+            raise
+        except BaseException:
+            with self._lock:
+                self._trial = False  # Not the server's fault; let another request try
+            raise
+        self.record()
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            changed = self.state != self.CLOSED
+            self.state = self.CLOSED
+        if changed:
+            self._notify(self.CLOSED)
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.OPEN:
+                self._opened_at = time.monotonic()  # Still down; wait a full reset_timeout again
+                return
+            if self.state == self.CLOSED and self.failures < self.failure_threshold:
+                return
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.trips += 1
+        self._notify(self.OPEN)
+
+    def record(self, error=None):
+        """Feed the outcome of a request: None for success, or the exception it raised."""
+        if error is None or not is_outage(error):
+            self.success()  # A 4xx still means the server is up
+        else:
+            self.failure()
+
+    def _notify(self, state):
+        for listener in self.listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                logger.error(f"Circuit listener failed: {str(e)}")
+
+    def stats(self):
+        return {"state": self.state, "trips": self.trips, "rejected": self.rejected}
+
+
+class ConnectivityMonitor:
+    """
+    Cached reachability of the tap server and the wider network.
+
+    step() probes both: a HEAD to the server (through http, the background
+    client, so a probe never holds a tap's socket) and a TCP connect to
+    upstream. Results feed the circuit breaker, so an outage opens it
+    before a tap has to wait out a timeout. While the circuit isn't closed the server is
+    probed every probe_interval seconds instead of every interval, so
+    traffic resumes as soon as it answers; the loop wakes every
+    probe_interval and runs step() when due(). Callers read the cached
+    state and never wait on the network.
+    """
+
+    def __init__(self, http, breaker, upstream=("1.1.1.1", 53), interval=10, probe_interval=2,
+                 timeout=2):
+        self.http = http
+        self.breaker = breaker
+        self.upstream = upstream
+        self.interval = interval
+        self.probe_interval = probe_interval
+        self.timeout = timeout
+
+        self.server_ok = None  # None until the first probe
+        self.internet_ok = None
+        self.checked_at = None
+        self.probes = 0
+        self._refresh = False
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="connectivity")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.due():
+                self.step()
+            self._wake.wait(self.probe_interval)
+            self._wake.clear()
+
+    def refresh(self):
+        """Ask for a fresh check at the next opportunity."""
+        self._refresh = True
+        self._wake.set()
+
+    def delay(self):
+        """Seconds between checks: interval while the circuit is closed, probe_interval otherwise."""
+        return self.interval if self.breaker.state == CircuitBreaker.CLOSED else self.probe_interval
+
+    def due(self):
+        if self._refresh or self.checked_at is None:
+            return True
+        return time.monotonic() - self.checked_at >= self.delay()
+
+    def step(self):
+        self._refresh = False
+        self.probes += 1
+        self.server_ok = self._probe_server()
+        self.internet_ok = self._probe_upstream()
+        self.checked_at = time.monotonic()
+
+    def _probe_server(self):
+        try:
+            response = self.http.request("HEAD", name="health", timeout=(self.timeout, self.timeout))
+            response.raise_for_status()
+        except RequestException as e:
+            self.breaker.record(e)
+            if self.server_ok is not False:
+                logger.warning(f"Tap server unreachable: {str(e)}")
+            return not is_outage(e)
+        self.breaker.record()
+        if self.server_ok is False:
+            logger.info("Tap server reachable again")
+        return True
+
+    def _probe_upstream(self):
+        try:
+            socket.create_connection(self.upstream, timeout=self.timeout).close()
+            return True
+        except OSError:
+            return False
+
+    def stats(self):
+        return {
+            "server_ok": self.server_ok,
+            "internet_ok": self.internet_ok,
+            "checked_s_ago": round(time.monotonic() - self.checked_at, 1) if self.checked_at else None,
+            "probes": self.probes,
+            "circuit": self.breaker.stats(),
+        }
@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class CardDetector:
+    """
+    How the run loop finds out a card is on the reader.
+
+    The reader is anything with the PN532 driver's read_passive_target /
+    listen_for_passive_target / get_passive_target methods, so a simulated
+    reader can stand in for the hardware. Detectors record detection latency
+    so the modes can be compared.
+    """
+
+    mode = "base"
+
+    def __init__(self, reader, history=200):
+        self.reader = reader
+        self.errors = 0
+        self.observer = None  # Called with each latency, e.g. Histogram.observe
+        self._latencies = deque(maxlen=history)
+
+    def next_interval(self):
+        """Seconds to wait before the next read()."""
+        return 0.0
+
+    def read(self, timeout=0.5):
+        """Return the UID of a card on the reader, or None."""
+        raise NotImplementedError
+
+    def wait_for_card(self, timeout=0.5):
+        interval = self.next_interval()
+        if interval:
+            time.sleep(interval)
+        return self.read(timeout)
+
+    def close(self):
+        pass
+
+    def _record(self, latency):
+        self._latencies.append(latency)
+        if self.observer is not None:
+            self.observer(latency)
+
+    def stats(self):
+        """Detection latency in milliseconds over the recent history."""
+        samples = sorted(self._latencies)
+        if not samples:
+            return {"mode": self.mode, "count": 0, "errors": self.errors}
+        return {
+            "mode": self.mode,
+            "count": len(samples),
+            "errors": self.errors,
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 1),
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+            "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 1),
+            "max_ms": round(samples[-1] * 1000, 1),
+        }
+
+
+class PollingDetector(CardDetector):
+    """
+    Timed polling with an adaptive gap between reads.
+
+    While a card stays on the reader the gap is max_interval, so a held
+    card doesn't keep the bus busy. The first empty poll after it leaves
+    drops the gap to min_interval (a quick re-tap is caught at once); every
+    further empty poll doubles it up to max_interval. Latency is measured
+    from the end of the previous empty poll to the UID coming back, which
+    bounds the real value from above.
+    """
+
+    mode = "poll"
+
+    def __init__(self, reader, min_interval=0.0, max_interval=0.1, history=200):
+        super().__init__(reader, history)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self._last_empty = time.monotonic()
+        self._present = None  # UID read by the last poll, if any
+
+    def next_interval(self):
+        return self.interval
+
+    def read(self, timeout=0.5):
+        try:
+            uid = self.reader.read_passive_target(timeout=timeout)
+        except RuntimeError as e:
+            self.errors += 1
+            logger.error(f"NFC read error: {str(e)}")
+            uid = None
+
+        now = time.monotonic()
+        if uid is None:
+            self._last_empty = now
+            if self._present is not None:
+                self.interval = self.min_interval  # Card just left
+            else:
+                self.interval = min(self.max_interval, max(self.interval * 2, 0.01))
+            self._present = None
+            return None
+
+        if uid != self._present:
+            self._record(now - self._last_empty)
+            self._present = uid
+        self._last_empty = now
+        self.interval = self.max_interval  # Still there on the next poll, most likely
+        return uid
+
+
+class IrqDetector(CardDetector):
+    """
+    Detection driven by the PN532 IRQ line.
+
+    The PN532 is left listening for a card; it pulls IRQ low when one shows
+    up, and only then is the UID read over I2C. Between cards the bus is
+    idle. A card left on the reader raises IRQ again as soon as the PN532
+    listens, so after a read returns a UID the next one waits max_interval,
+    as PollingDetector does; the first read that finds nothing ends that.
+    Latency is measured from the IRQ edge to a new UID coming back. The
+    line is watched through the controller's events.EventBus.
+    """
+
+    mode = "irq"
+
+    def __init__(self, reader, irq_pin, events, max_interval=0.1, history=200):
+        super().__init__(reader, history)
+        self.irq_pin = irq_pin
+        self.gpio = events.gpio
+        self.max_interval = max_interval
+        self._ready = threading.Event()
+        self._edge_time = 0.0
+        self._listening = False
+        self._present = None  # UID returned by the last read, if any
+        events.watch(irq_pin, self._irq_edge)
+
+    def next_interval(self):
+        return self.max_interval if self._present is not None else 0.0
+
+    def _irq_edge(self, pin, level, at):
+        if not level:
+            self._on_edge(pin)
+
+    def _on_edge(self, channel):
+        self._edge_time = time.monotonic()
+        self._ready.set()
+
+    def read(self, timeout=0.5):
+        try:
+            if not self._listening:
+                self._listening = self.reader.listen_for_passive_target(timeout=timeout)
+                if not self._listening:
+                    self._present = None
+                    return None
+                # The command's ACK also pulses IRQ; only a low line from here on means a card
+                self._ready.clear()
+                if not self.gpio.input(self.irq_pin):
+                    self._on_edge(self.irq_pin)
+            if not self._ready.wait(timeout):
+                self._present = None
+                return None
+            self._ready.clear()
+            self._listening = False
+            uid = self.reader.get_passive_target(timeout=timeout)
+        except RuntimeError as e:
+            self.errors += 1
+            self._listening = False
+            self._present = None
+            logger.error(f"NFC read error: {str(e)}")
+            return None
+
+        if uid is not None and uid != self._present:
+            self._record(time.monotonic() - self._edge_time)
+        self._present = uid
+        return uid
+
+
+
+def make_detector(reader, irq_pin=None, min_interval=0.0, max_interval=0.1, events=None):
+    """IRQ detection when the line is wired (and the event bus has GPIO), polling otherwise."""
+    if irq_pin is not None:
+        try:
+            if events is None or events.gpio is None:
+                raise RuntimeError("RPi.GPIO not available")
+            detector = IrqDetector(reader, irq_pin, events, max_interval=max_interval)
+            logger.info(f"NFC detection: IRQ on GPIO{irq_pin}")
+            return detector
+        except RuntimeError as e:
+            logger.warning(f"IRQ detection unavailable, polling instead: {str(e)}")
+    logger.info("NFC detection: adaptive polling")
+    return PollingDetector(reader, min_interval=min_interval, max_interval=max_interval)
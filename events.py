@@ -0,0 +1,237 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# BCM 2 and 3 are SDA and SCL: the PN532 and ADS1115 are on them
+I2C_PINS = (2, 3)
+
+# name is e.g. "card" or "<button>.<gesture>"; source the reader or button it came from
+Event = namedtuple("Event", "name source data at")
+
+
+class EventBus:
+    """
+    In-process events from GPIO inputs, buttons and card reads.
+
+    publish() is safe from any thread and returns at once; handlers run one
+    at a time on the bus's worker, which sleeps until an event arrives or a
+    timer (call_later) is due, so nothing polls. Handlers subscribed to "*"
+    see every event, before its own handlers do. GPIO edges are registered once per pin with watch();
+    edge callbacks run on RPi.GPIO's own thread and must be quick (the
+    PN532 IRQ only sets an event there). gpio is the RPi.GPIO module, or
+    None where it isn't available.
+    """
+
+    def __init__(self, gpio=None):
+        self.gpio = gpio
+        self.published = 0
+        self.errors = 0
+        self.buttons = {}
+        self._handlers = defaultdict(list)
+        self._watchers = {}
+        self._queue = queue.SimpleQueue()
+        self._timers = []  # heap of (when, seq, call)
+        self._seq = itertools.count()
+        self._thread = None
+        if gpio is not None:
+            gpio.setmode(gpio.BCM)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="events")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+        if self.gpio is not None:
+            for pin in self._watchers:
+                try:
+                    self.gpio.remove_event_detect(pin)
+                except Exception:
+                    pass
+
+    def subscribe(self, name, handler):
+        self._handlers[name].append(handler)
+
+    def publish(self, name, source=None, **data):
+        self._queue.put(Event(name, source, data, time.monotonic()))
+
+    def call_soon(self, fn, *args):
+        """Run fn on the bus worker."""
+        self._queue.put([fn, args])
+
+    def call_later(self, delay, fn, *args):
+        """Run fn on the bus worker after delay seconds. Only call from the worker; returns a handle for cancel()."""
+        call = [fn, args]
+        heapq.heappush(self._timers, (time.monotonic() + delay, next(self._seq), call))
+        return call
+
+    def cancel(self, call):
+        call[0] = None
+
+    def watch(self, pin, callback, pull_up=True):
+        """Call callback(pin, level, at) on every edge of a BCM pin. The I2C pins are refused."""
+        if self.gpio is None:
+            raise RuntimeError("RPi.GPIO not available")
+        if pin in I2C_PINS:
+            raise RuntimeError(f"GPIO{pin} is an I2C line (SDA/SCL)")
+        if pin not in self._watchers:
+            gpio = self.gpio
+            gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP if pull_up else gpio.PUD_DOWN)
+            self._watchers[pin] = []
+            gpio.add_event_detect(pin, gpio.BOTH, callback=self._edge)
+        self._watchers[pin].append(callback)
+
+    def _edge(self, pin):
+        at = time.monotonic()
+        level = self.gpio.input(pin)
+        for callback in self._watchers.get(pin, ()):
+            try:
+                callback(pin, level, at)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"GPIO{pin} edge handler failed: {str(e)}")
+
+    def add_button(self, name, pin, **kwargs):
+        """A debounced, active-low button on a BCM pin publishing <name>.short/.long/.multi."""
+        button = Button(self, name, pin, **kwargs)
+        self.watch(pin, button.edge)
+        self.buttons[name] = button
+        return button
+
+    def _run(self):
+        while True:
+            timeout = None
+            while self._timers:
+                when, _, call = self._timers[0]
+                if call[0] is None:
+                    heapq.heappop(self._timers)
+                    continue
+                timeout = when - time.monotonic()
+                if timeout > 0:
+                    break
+                heapq.heappop(self._timers)
+                self._call(*call)
+                timeout = None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            if isinstance(item, Event):
+                self._dispatch(item)
+            elif item[0] is not None:
+                self._call(*item)
+
+    def _dispatch(self, event):
+        self.published += 1
+        # "*" first: the power manager has to be awake before a handler shows anything
+        for handler in self._handlers.get("*", []) + self._handlers.get(event.name, []):
+            self._call(handler, (event,))
+
+    def _call(self, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Event handler {getattr(fn, '__name__', fn)} failed: {str(e)}")
+
+    def stats(self):
+        return {"published": self.published, "errors": self.errors,
+                "buttons": {name: button.stats() for name, button in self.buttons.items()}}
+
+
+class Button:
+    """
+    Turns a button's edges into gestures.
+
+    An edge starts a debounce timer; when it runs out the pin is read and,
+    if the level changed, that is a press or release (at the time of the
+    burst's first edge). Held for long_press seconds is a "long" gesture,
+    fired while still held. Otherwise presses are counted until
+    multi_window seconds pass without another: one is "short", more is
+    "multi" with the count in the event's data. All of this runs on the
+    bus worker.
+    """
+
+    def __init__(self, bus, name, pin, debounce=0.03, long_press=1.5, multi_window=0.4):
+        self.bus = bus
+        self.name = name
+        self.pin = pin
+        self.debounce = debounce
+        self.long_press = long_press
+        self.multi_window = multi_window
+        self.pressed = False
+        self.bounces = 0
+        self.gestures = defaultdict(int)
+        self._first_edge = None
+        self._settle = None
+        self._long = None
+        self._gesture = None
+        self._long_fired = False
+        self._count = 0
+
+    def edge(self, pin, level, at):
+        self.bus.call_soon(self._bounce, at)
+
+    def _bounce(self, at):
+        if self._settle is None:
+            self._first_edge = at
+        else:
+            self.bus.cancel(self._settle)
+        self._settle = self.bus.call_later(self.debounce, self._settled)
+
+    def _settled(self):
+        self._settle = None
+        pressed = not self.bus.gpio.input(self.pin)
+        if pressed == self.pressed:
+            self.bounces += 1
+            return
+        self.pressed = pressed
+        if pressed:
+            self._press(self._first_edge)
+        else:
+            self._release()
+
+    def _press(self, at):
+        self._long_fired = False
+        if self._gesture is not None:
+            self.bus.cancel(self._gesture)
+            self._gesture = None
+        self._long = self.bus.call_later(max(0.0, at + self.long_press - time.monotonic()), self._held)
+
+    def _held(self):
+        self._long = None
+        self._long_fired = True
+        self._count = 0
+        self._fire("long", 1)
+
+    def _release(self):
+        if self._long is not None:
+            self.bus.cancel(self._long)
+            self._long = None
+        if self._long_fired:
+            return
+        self._count += 1
+        self._gesture = self.bus.call_later(self.multi_window, self._done)
+
+    def _done(self):
+        self._gesture = None
+        count, self._count = self._count, 0
+        self._fire("short" if count == 1 else "multi", count)
+
+    def _fire(self, gesture, count):
+        self.gestures[gesture] += 1
+        self.bus.publish(f"{self.name}.{gesture}", self.name, count=count)
+
+    def stats(self):
+        return {"bounces": self.bounces, **self.gestures}
@@ -0,0 +1,64 @@
+import time
+from collections import deque
+
+
+class FrameClock:
+    """
+    Paces compiled frames against absolute monotonic deadlines.
+
+    Each frame's slot starts where the previous one's ended, measured from
+    when the animation started, so a slow frame doesn't push every later
+    one back and the animation keeps its duration. When playback falls
+    behind, frames whose slot has already passed are dropped (the final,
+    held frame is always shown). Lateness of every frame shown is kept
+    as jitter, and each animation's achieved frame rate is recorded
+    against its target.
+    """
+
+    def __init__(self, now=time.monotonic, window=512):
+        self.now = now
+        self.frames = 0
+        self.dropped = 0
+        self.target_fps = None  # Of the last animation played
+        self.achieved_fps = None
+        self._lateness = deque(maxlen=window)
+
+    def plan(self, frames):
+        """
+        Yield (frame, wake_at) for each (frame, hold) that is still on time.
+
+        The caller shows the frame, then sleeps until wake_at (None for the
+        final frame). Stopping early just abandons the generator.
+        """
+        total = sum(hold for _, hold in frames)
+        start = slot = self.now()
+        shown = 0
+        try:
+            for frame, hold in frames:
+                end = slot + hold
+                now = self.now()
+                if hold and now >= end:
+                    self.dropped += 1  # Its slot is over; the next frame is due
+                else:
+                    self._lateness.append(max(0.0, now - slot))
+                    self.frames += 1
+                    shown += 1
+                    yield frame, end if hold else None
+                slot = end
+        finally:
+            played = min(self.now(), slot) - start
+            if total > 0 and played > 0:
+                self.target_fps = round(len(frames) / total, 1)
+                self.achieved_fps = round(shown / played, 1)
+
+    def jitter(self):
+        """Frame lateness percentiles over the recent window, in milliseconds."""
+        samples = sorted(self._lateness)
+        if not samples:
+            return {}
+        pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 3)
+        return {"p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": round(samples[-1] * 1000, 3)}
+
+    def stats(self):
+        return {"frames": self.frames, "dropped": self.dropped, "target_fps": self.target_fps,
+                "achieved_fps": self.achieved_fps, "jitter": self.jitter()}
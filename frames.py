@@ -0,0 +1,290 @@
+import logging
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OFF = (0, 0, 0)
+
+
+def parse_color(color_str):
+    """Parse a 'RRRGGGBBB' color string into an RGB tuple."""
+    try:
+        red = int(color_str[:3])
+        green = int(color_str[3:6])
+        blue = int(color_str[6:])
+        return (red, green, blue)
+    except (ValueError, IndexError):
+        logger.error(f"Invalid color string: {color_str}")
+        return (0, 0, 0)
+
+
+def wheel(pos):
+    """Generate rainbow colors across 0-255 positions."""
+    if pos < 85:
+        return (int(pos * 3), int(255 - pos * 3), 0)
+    elif pos < 170:
+        pos -= 85
+        return (int(255 - pos * 3), 0, int(pos * 3))
+    else:
+        pos -= 170
+        return (0, int(pos * 3), int(255 - pos * 3))
+
+
+def wheel_array(pos):
+    """wheel() for a whole array of positions at once; returns RGB rows."""
+    pos = np.asarray(pos, dtype=np.int32) & 255
+    band = np.minimum(pos // 85, 2)
+    rising = (pos - band * 85) * 3
+    falling = 255 - rising
+    zero = np.zeros_like(pos)
+    return np.choose(band[..., None], [
+        np.stack([rising, falling, zero], axis=-1),
+        np.stack([falling, zero, rising], axis=-1),
+        np.stack([zero, rising, falling], axis=-1),
+    ])
+
+
+def scale(color, brightness):
+    """Scale an RGB color by a brightness (0–100)."""
+    factor = brightness / 100.0
+    r, g, b = color
+    return (int(r * factor), int(g * factor), int(b * factor))
+
+
+def scale_array(colors, brightness):
+    """scale() for an array of RGB rows."""
+    return (np.asarray(colors) * (brightness / 100.0)).astype(np.int32)
+
+
+def gamma_table(gamma):
+    """Lookup table mapping each 8-bit level through a gamma curve, or None for gamma 1."""
+    if gamma == 1:
+        return None
+    return np.round(255 * (np.arange(256) / 255) ** gamma).astype(np.uint8)
+
+
+def encode(colors, order="GRB"):
+    """Pack a list of RGB tuples into a raw pixel buffer in the ring's byte order."""
+    idx = ["RGB".index(c) for c in order]
+    return bytes(color[i] for color in colors for i in idx)
+
+
+def encode_frames(frames, order="GRB", table=None):
+    """
+    Pack several frames (lists of RGB tuples or (n, 3) arrays) into raw pixel
+    buffers in one pass: stacked into a single array, run through the gamma
+    table and reordered to the ring's byte order.
+    """
+    if not frames:
+        return []
+    pixels = np.asarray(frames, dtype=np.uint8).reshape(len(frames), -1, 3)
+    if table is not None:
+        pixels = table[pixels]
+    pixels = pixels[..., ["RGB".index(c) for c in order]]
+    return [row.tobytes() for row in pixels]
+
+
+def frame_slots(duration, fps):
+    """Frame count and hold for duration seconds at about fps, ending exactly on time (at least one frame)."""
+    count = max(1, round(duration * fps))
+    return count, max(duration, 1 / fps) / count
+
+
+# Compilers: each returns a list of (colors, hold_seconds) frames.
+# The final frame is held with 0 to leave the ring in that state.
+
+def compile_solid(n, color_str, duration_ms, brightness):
+    color = scale(parse_color(color_str), brightness)
+    return [([color] * n, duration_ms / 1000), ([OFF] * n, 0)]
+
+
+def compile_spinner(n, color_str, duration_ms, brightness, wait=0.01):
+    """A single lit LED spinning round the ring, at least one revolution."""
+    color = scale(parse_color(color_str), brightness)
+    revolution = []
+    for i in range(n):
+        frame = [OFF] * n
+        frame[i] = color
+        revolution.append((frame, wait))
+    revolutions = max(1, math.ceil((duration_ms / 1000) / (n * wait)))
+    return revolution * revolutions + [([OFF] * n, 0)]
+
+
+def compile_split(n, color_str, duration_ms, brightness):
+    """Fill the ring, then clear it from the top and bottom outwards."""
+    if n < 4:
+        return compile_solid(n, color_str, duration_ms, brightness)  # Too short to split
+    delay = (duration_ms / 1000) / (n // 2)
+    frame = [scale(parse_color(color_str), brightness)] * n
+    frames = [(list(frame), 0.2)]
+
+    half = n // 2  # 12
+    steps = half - 1        # we exclude 0 and 12 (the verticals)
+
+    for i in range(steps // 2 + 1):
+        # right side (clockwise from top)
+        right_index = 1 + i
+        # left side (counterclockwise from top)
+        left_index = (n - 1) - i
+
+        # also their mirrored counterparts on the bottom half
+        right_mirror = (half + right_index) % n
+        left_mirror = (half + left_index) % n
+
+        for idx in [right_index, left_index, right_mirror, left_mirror]:
+            frame[idx] = OFF
+        frames.append((list(frame), delay))
+
+    # Finally, turn off 0 and 12
+    frame[0] = OFF
+    frame[half] = OFF
+    frames.append((frame, 0))
+    return frames
+
+
+def compile_rainbow(n, color_str, duration_ms, brightness, fps=200):
+    """Spin a rainbow across the ring, fading out by the end of duration_ms (color_str is unused)."""
+    # One row per rotation step (a step of 8 = visible rotation speed)
+    positions = np.arange(n) * 256 // n + np.arange(0, 255, 8)[:, None]
+    cycle = list(scale_array(wheel_array(positions), brightness))
+
+    levels = np.arange(255, -1, -20)[:, None, None]
+    fade_hold = 0.01
+    count, hold = frame_slots(duration_ms / 1000 - len(levels) * fade_hold, fps)
+    frames = [(cycle[k % len(cycle)], hold) for k in range(count)]
+
+    # Fade out gracefully from the last frame drawn
+    fades = frames[-1][0] * levels // 255
+    frames.extend((fade, fade_hold) for fade in fades)
+    frames.append(([OFF] * n, 0))
+    return frames
+
+
+def compile_battery_level(n, percentage, brightness, hold=2):
+    """Light a share of the ring proportional to the battery level."""
+    if percentage > 60:
+        color = (0, 255, 0)  # Green
+    elif percentage > 30:
+        color = (255, 255, 0)  # Yellow
+    else:
+        color = (255, 0, 0)  # Red
+
+    lit_leds = int(n * percentage / 100)
+    frame = [scale(color, brightness)] * lit_leds + [OFF] * (n - lit_leds)
+    return [(frame, hold), ([OFF] * n, 0)]
+
+
+def compile_low_battery(n, brightness=100):
+    """Three quick orange blinks."""
+    color = scale((25, 5, 0), brightness)
+    return [([color] * n, 0.05), ([OFF] * n, 0.05)] * 3 + [([OFF] * n, 0)]
+
+
+def compile_off(n):
+    return [([OFF] * n, 0)]
+
+
+def _pattern(colors, shift, n):
+    """Tile colors (an array of RGB rows) round the ring and rotate the result by shift pixels."""
+    ring = colors[np.arange(n) % len(colors)]
+    return np.roll(ring, int(round(shift)) % n if n else 0, axis=0)
+
+
+def compile_program(n, program, brightness):
+    """Interpolate a keyframe program (see programs.Program) at its frame rate."""
+    keys = [
+        (t / 1000, scale_array([parse_color(c) for c in colors], brightness), shift, ease)
+        for t, colors, shift, ease in program.keyframes
+    ]
+    cycle = []
+    for (t0, c0, s0, _), (t1, c1, s1, ease) in zip(keys, keys[1:]):
+        count, hold = frame_slots(t1 - t0, program.fps)
+        for k in range(count):
+            f = 0.0 if ease == "step" else k / count
+            shift = s0 + (s1 - s0) * f
+            colors = _pattern(c0, shift, n)
+            if f:
+                colors = (colors + (_pattern(c1, shift, n) - colors) * f).astype(np.int32)
+            if cycle and np.array_equal(cycle[-1][0], colors):
+                cycle[-1] = (cycle[-1][0], cycle[-1][1] + hold)  # Merge steady stretches
+            else:
+                cycle.append((colors, hold))
+
+    # The last keyframe gets one frame, then the ring goes dark like every other animation
+    _, colors, shift, _ = keys[-1]
+    return cycle * program.loops + [(_pattern(colors, shift, n), 1 / program.fps), ([OFF] * n, 0)]
+
+
+COMPILERS = {
+    "solid": compile_solid,
+    "spin": compile_spinner,
+    "split": compile_split,
+    "rainbow": compile_rainbow,
+    "battery": compile_battery_level,
+    "low_battery": compile_low_battery,
+    "off": compile_off,
+    "program": compile_program,
+}
+
+
+class FrameCache:
+    """
+    Bounded LRU cache of compiled animations.
+
+    Keys are (name, *params); values are tuples of (raw_frame_bytes, hold_seconds)
+    ready to be copied straight into the NeoPixel buffer. Gamma correction
+    is applied when frames are encoded, so playback costs nothing extra.
+    """
+
+    def __init__(self, num_pixels, order="GRB", maxsize=32, gamma=1.0):
+        self.num_pixels = num_pixels
+        self.order = order
+        self.maxsize = maxsize
+        self.gamma = gamma
+        self._table = gamma_table(gamma)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, *params):
+        if name not in COMPILERS:
+            name = "rainbow"  # Unknown animations have always fallen back to the rainbow
+        key = (name,) + params
+        with self._lock:
+            frames = self._entries.get(key)
+            if frames is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return frames
+
+        frames = self.compile(name, *params)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = frames
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return frames
+
+    def compile(self, name, *params):
+        compiler = COMPILERS[name]
+        # Frames that repeat (spinner revolutions, rainbow cycles) share one buffer
+        index = {}
+        unique = []
+        plan = []
+        for colors, hold in compiler(self.num_pixels, *params):
+            key = id(colors)
+            if key not in index:
+                index[key] = len(unique)
+                unique.append(colors)
+            plan.append((index[key], hold))
+        buffers = encode_frames(unique, self.order, self._table)
+        return tuple((buffers[i], hold) for i, hold in plan)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Shared keep-alive HTTP client.
+
+    One requests.Session with a pool of pool_size connections is shared by
+    every thread that uses it, so taps reuse a warm TCP connection instead
+    of opening a new one. A background thread warms the pool on start and
+    sends a cheap HEAD when the connection has been idle for
+    keepalive_interval seconds.
+
+    With block the pool never grows past pool_size and callers queue for a
+    free socket. Without it (the tap client), a caller that finds every
+    socket busy opens a short-lived extra connection rather than wait for
+    one with no limit. Background work (health checks, telemetry, queue
+    drains, program fetches) goes through background(), a client on a pool
+    of its own, so it never holds a socket a tap is waiting for.
+    """
+
+    def __init__(self, base_url, connect_timeout=2, read_timeout=5, pool_size=4,
+                 keepalive_interval=30, history=200, block=False):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.keepalive_interval = keepalive_interval
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=block)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._history = history
+        self._timings = {}
+        self._lock = threading.Lock()
+        self._last_used = 0.0
+        self._active = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def background(self, pool_size=2):
+        """A client for background calls to the same server, on its own blocking pool."""
+        return HttpClient(self.base_url, *self.timeout, pool_size=pool_size,
+                          keepalive_interval=self.keepalive_interval, history=self._history, block=True)
+
+    def start(self):
+        """Warm up the pool and start the keep-alive thread (asyncio mode runs its own)."""
+        self._active = True
+        self._thread = threading.Thread(target=self._keepalive, name="http-keepalive")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._active = False
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+        self.session.close()
+
+    def request(self, method, path="", name=None, **kwargs):
+        """Send a request through the shared pool and record how long it took."""
+        kwargs.setdefault("timeout", self.timeout)
+        url = path if path.startswith("http") else self.base_url + path
+        start = time.monotonic()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            end = time.monotonic()
+            self._last_used = end
+            self._record(name or f"{method} {path}", end - start)
+
+    def get(self, path="", **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path="", **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def idle(self):
+        """Seconds since the pool was last used."""
+        return time.monotonic() - self._last_used
+
+    def warm_up(self):
+        """Open a pooled connection to the server ahead of the first tap."""
+        try:
+            self.request("HEAD", name="keepalive")
+            return True
+        except RequestException as e:
+            logger.warning(f"HTTP warm-up failed: {str(e)}")
+            return False
+
+    def _keepalive(self):
+        self.warm_up()
+        while self._active:
+            idle = self.idle()
+            if idle >= self.keepalive_interval:
+                self.warm_up()
+                idle = 0
+            if self._stop.wait(self.keepalive_interval - idle):
+                return
+
+    def _record(self, name, elapsed):
+        with self._lock:
+            samples = self._timings.get(name)
+            if samples is None:
+                samples = self._timings[name] = deque(maxlen=self._history)
+            samples.append(elapsed)
+        logger.debug("%s took %.1fms", name, elapsed * 1000)
+
+    def stats(self):
+        """Recent request timings per endpoint, in milliseconds."""
+        with self._lock:
+            timings = {name: sorted(samples) for name, samples in self._timings.items()}
+        return {
+            name: {
+                "count": len(s),
+                "avg_ms": round(sum(s) / len(s) * 1000, 1),
+                "p50_ms": round(s[len(s) // 2] * 1000, 1),
+                "max_ms": round(s[-1] * 1000, 1),
+            }
+            for name, s in timings.items() if s
+        }
@@ -0,0 +1,137 @@
+import inspect
+import threading
+import time
+
+# Lower rank goes first. The reader's traffic is what the user waits on;
+# battery samples can wait for a gap.
+PRIORITIES = {"nfc": 0, "battery": 1}
+
+
+class BusArbiter:
+    """
+    Serializes transactions on the shared I2C bus, highest priority first.
+
+    Devices are claimed by name. When the bus is released it goes to the
+    waiting claim with the lowest rank, oldest first; a claim that has been
+    deferred for longer than max_defer seconds is served next regardless,
+    so a card held on the reader can't starve the battery sampler for good.
+    Every claim is timed; a claim that had to wait counts as contended.
+    """
+
+    def __init__(self, priorities=PRIORITIES, max_defer=1.0):
+        self.priorities = dict(priorities)
+        self.max_defer = max_defer
+        self.observer = None  # Called with (name, seconds waited) for each claim
+        self._cond = threading.Condition()
+        self._owner = None
+        self._waiting = []
+        self._stats = {}
+
+    def claim(self, name):
+        """Context manager holding the bus for one transaction."""
+        return _Claim(self, name)
+
+    def wrap(self, device, name):
+        """A proxy for device whose every call and property access holds the bus."""
+        return SharedDevice(device, self, name)
+
+    def acquire(self, name):
+        rank = self.priorities.get(name, len(self.priorities))
+        start = time.perf_counter()
+        with self._cond:
+            ticket = (rank, start, name)
+            self._waiting.append(ticket)
+            contended = self._owner is not None or len(self._waiting) > 1
+            while self._owner is not None or self._next() is not ticket:
+                self._cond.wait()
+            self._waiting.remove(ticket)
+            self._owner = name
+        waited = time.perf_counter() - start
+
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = {"claims": 0, "contended": 0, "wait_s": 0.0, "max_wait_s": 0.0, "held_s": 0.0}
+        stats["claims"] += 1
+        if contended:
+            stats["contended"] += 1
+            stats["wait_s"] += waited
+            stats["max_wait_s"] = max(stats["max_wait_s"], waited)
+        if self.observer is not None:
+            self.observer(name, waited)
+        return time.perf_counter()
+
+    def release(self, name, acquired):
+        self._stats[name]["held_s"] += time.perf_counter() - acquired
+        with self._cond:
+            self._owner = None
+            self._cond.notify_all()
+
+    def _next(self):
+        now = time.perf_counter()
+        return min(
+            self._waiting,
+            key=lambda t: (-1 if now - t[1] > self.max_defer else t[0], t[1])
+        )
+
+    def contended(self, name):
+        stats = self._stats.get(name)
+        return stats["contended"] if stats else 0
+
+    def stats(self):
+        """Claims, contended claims and wait/hold time per device, in milliseconds."""
+        return {
+            name: {
+                "claims": s["claims"],
+                "contended": s["contended"],
+                "avg_wait_ms": round(s["wait_s"] / s["contended"] * 1000, 2) if s["contended"] else 0.0,
+                "max_wait_ms": round(s["max_wait_s"] * 1000, 2),
+                "held_ms": round(s["held_s"] * 1000, 1),
+            }
+            for name, s in list(self._stats.items())
+        }
+
+
+class _Claim:
+    __slots__ = ("bus", "name", "acquired")
+
+    def __init__(self, bus, name):
+        self.bus = bus
+        self.name = name
+
+    def __enter__(self):
+        self.acquired = self.bus.acquire(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.bus.release(self.name, self.acquired)
+
+
+class SharedDevice:
+    """
+    Stands in for a driver object, holding the bus around each method call
+    and each property read or write (driver properties often do I/O).
+    """
+
+    def __init__(self, device, bus, name):
+        object.__setattr__(self, "_device", device)
+        object.__setattr__(self, "_bus", bus)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr):
+        device = self._device
+        if isinstance(inspect.getattr_static(type(device), attr, None), property):
+            with self._bus.claim(self._name):
+                return getattr(device, attr)
+        value = getattr(device, attr)
+        if not callable(value):
+            return value
+        bus, name = self._bus, self._name
+
+        def call(*args, **kwargs):
+            with bus.claim(name):
+                return value(*args, **kwargs)
+        return call
+
+    def __setattr__(self, attr, value):
+        with self._bus.claim(self._name):
+            setattr(self._device, attr, value)
@@ -0,0 +1,203 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler
+
+FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Puts records on a queue for the log writer thread, unformatted.
+
+    The stock QueueHandler formats the message on the caller's thread;
+    here msg and args travel as they are and are only merged when a
+    handler writes the record, so a log call on the tap path costs a
+    queue put. Pass values that won't change afterwards. When the queue
+    is full records are dropped and counted rather than blocking.
+    """
+
+    def __init__(self, q, maxsize=10000):
+        super().__init__(q)
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.put(record)
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the last capacity records in memory and appends them to path in batches.
+
+    Records are written once batch_size have piled up, flush_interval has
+    passed, or one at flush_level or above arrives. The file is meant for
+    tmpfs: at max_bytes it is moved to path + ".1" and started afresh, so
+    at most twice that stays on disk. Records overwritten before they
+    could be written are counted in lost. With no path, or one whose
+    directory can't be created, the buffer is in memory only.
+    """
+
+    def __init__(self, path=None, capacity=2000, batch_size=200, flush_interval=30,
+                 max_bytes=1024 * 1024, flush_level=logging.ERROR):
+        super().__init__()
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.flush_level = flush_level
+        self.records = deque(maxlen=capacity)
+        self.flushes = 0
+        self.written = 0
+        self.lost = 0
+        self.errors = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._size = 0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._size = os.path.getsize(path) if os.path.exists(path) else 0
+            except OSError:
+                self.path = None
+                self.errors += 1
+
+    def emit(self, record):
+        self.records.append(record)
+        if self._pending < self.capacity:
+            self._pending += 1
+        else:
+            self.lost += 1
+        if (self._pending >= self.batch_size or record.levelno >= self.flush_level
+                or time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self._pending = self._pending, 0
+            self._last_flush = time.monotonic()
+            if not pending or not self.path:
+                return
+            batch = list(self.records)[-pending:]
+            try:
+                text = "".join(self.format(record) + "\n" for record in batch)
+                if self._size and self._size + len(text) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                    self._size = 0
+                with open(self.path, "a") as f:
+                    f.write(text)
+            except Exception:
+                self.errors += 1  # Nowhere to log this; counted instead
+                return
+            self._size += len(text)
+            self.flushes += 1
+            self.written += pending
+
+    def stats(self):
+        return {"buffered": len(self.records), "pending": self._pending, "flushes": self.flushes,
+                "written": self.written, "lost": self.lost, "errors": self.errors}
+
+
+class LogPipeline:
+    """
+    Root logging through a queue and a single writer thread.
+
+    Callers only enqueue records (see LazyQueueHandler); the "log-writer"
+    thread formats them and hands them to the handlers, and flushes them
+    all after flush_interval seconds without a record.
+    """
+
+    def __init__(self, handlers, queue_size=10000, flush_interval=30):
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.handler = LazyQueueHandler(self.queue, queue_size)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Write out everything queued and buffered. Safe to call twice."""
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for handler in self.handlers:
+            handler.flush()
+
+    def _run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+                continue
+            if record is None:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    @property
+    def dropped(self):
+        return self.handler.dropped + sum(getattr(h, "lost", 0) for h in self.handlers)
+
+    def stats(self):
+        stats = {"queued": self.queue.qsize(), "dropped": self.handler.dropped}
+        for handler in self.handlers:
+            if isinstance(handler, RingBufferHandler):
+                stats["ring"] = handler.stats()
+        return stats
+
+
+def _level(value):
+    return value if isinstance(value, int) else logging.getLevelName(value.upper())
+
+
+def setup_logging(level="INFO", console_level="WARNING", path=None, capacity=2000, batch_size=200,
+                  flush_interval=30, max_bytes=1024 * 1024, queue_size=10000):
+    """
+    Route the root logger through a LogPipeline and start it.
+
+    Records at level and above go to the ring buffer (and path); only
+    console_level and above reach stderr, i.e. journald and the SD card.
+    Debug calls below level are discarded by the logger before any
+    argument is formatted. The pipeline is flushed at exit.
+    """
+    formatter = logging.Formatter(FORMAT)
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(console_level)
+    ring = RingBufferHandler(path, capacity=capacity, batch_size=batch_size,
+                             flush_interval=flush_interval, max_bytes=max_bytes)
+    ring.setLevel(level)
+    for handler in (console, ring):
+        handler.setFormatter(formatter)
+
+    pipeline = LogPipeline([console, ring], queue_size=queue_size, flush_interval=flush_interval)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(pipeline.handler)
+    root.setLevel(min(_level(level), _level(console_level)))
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    if path and ring.path is None:
+        logging.getLogger(__name__).warning(f"Can't write logs to {path}; keeping them in memory only")
+    return pipeline
@@ -0,0 +1,224 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers a 0.1ms stage up to a 5s server timeout
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram. observe() is a bisect and three additions."""
+
+    kind = "histogram"
+
+    def __init__(self, labels, buckets=DEFAULT_BUCKETS):
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def samples(self, name):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            yield f"{name}_bucket{_format_labels(self.labels, {'le': bound})} {cumulative}"
+        yield f"{name}_bucket{_format_labels(self.labels, {'le': '+Inf'})} {count}"
+        yield f"{name}_sum{_format_labels(self.labels)} {total:.6f}"
+        yield f"{name}_count{_format_labels(self.labels)} {count}"
+
+
+class Counter:
+    """A counter we own (inc) or one read from elsewhere (fn)."""
+
+    kind = "counter"
+
+    def __init__(self, labels, fn=None):
+        self.labels = labels
+        self.fn = fn
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def samples(self, name):
+        value = self.fn() if self.fn is not None else self.value
+        yield f"{name}{_format_labels(self.labels)} {value}"
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, labels, fn=None):
+        self.labels = labels
+        self.fn = fn
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name):
+        value = self.fn() if self.fn is not None else self.value
+        if value is not None:
+            yield f"{name}{_format_labels(self.labels)} {value}"
+
+
+class RateGauge(Gauge):
+    """Per-second rate of a growing count, measured between scrapes."""
+
+    def __init__(self, labels, fn):
+        super().__init__(labels)
+        self._count_fn = fn
+        self._last = (time.monotonic(), fn())
+        self.fn = self._rate
+
+    def _rate(self):
+        now, count = time.monotonic(), self._count_fn()
+        then, previous = self._last
+        self._last = (now, count)
+        if now - then <= 0:
+            return None
+        return round((count - previous) / (now - then), 2)
+
+
+class Registry:
+    """Named metric families rendered in the Prometheus text format."""
+
+    def __init__(self, prefix="jas_tap_"):
+        self.prefix = prefix
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _add(self, name, help_text, metric):
+        with self._lock:
+            family = self._families.setdefault(self.prefix + name, (help_text, metric.kind, []))
+            family[2].append(metric)
+        return metric
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+        return self._add(name, help_text, Histogram(labels, buckets))
+
+    def counter(self, name, help_text, fn=None, **labels):
+        return self._add(name, help_text, Counter(labels, fn))
+
+    def gauge(self, name, help_text, fn=None, **labels):
+        return self._add(name, help_text, Gauge(labels, fn))
+
+    def rate(self, name, help_text, fn, **labels):
+        return self._add(name, help_text, RateGauge(labels, fn))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            families = list(self._families.items())
+        for name, (help_text, kind, metrics) in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for metric in metrics:
+                try:
+                    lines.extend(metric.samples(name))
+                except Exception as e:
+                    logger.debug(f"Metric {name} failed: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Publishes a Registry for scraping.
+
+    The text is rewritten every interval seconds to path (meant for tmpfs,
+    e.g. /dev/shm, so nothing touches the SD card) and, if port is set,
+    served at http://127.0.0.1:<port>/metrics.
+    """
+
+    def __init__(self, registry, path=None, port=None, interval=10):
+        self.registry = registry
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self, write_thread=True):
+        """Start the HTTP endpoint and, unless the caller drives write(), the file writer."""
+        if self.port:
+            self._serve()
+        if self.path and write_thread:
+            self._thread = threading.Thread(target=self._writer, name="metrics")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def write(self):
+        """Atomically replace the metrics file."""
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(self.registry.render())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"Metrics write failed: {str(e)}")
+
+    def _writer(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def _serve(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            logger.error(f"Metrics endpoint unavailable: {str(e)}")
+            return
+        thread = threading.Thread(target=self._server.serve_forever, name="metrics-http")
+        thread.daemon = True
+        thread.start()
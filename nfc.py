@@ -1,254 +1,409 @@
+import time
+_imports_started = time.monotonic()  # Startup phases are timed from here
+
 import board
 import busio
-import time
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from digitalio import DigitalInOut
 from adafruit_pn532.i2c import PN532_I2C
-import neopixel
-import requests
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
-from requests.exceptions import RequestException
 import subprocess
-import time
-import math
+import os
+# NeoPixel/NumPy, ADS1115 and requests are imported by the startup phases
+# that need them, so they load while the NFC reader is coming up
+from prediction import DecisionCache, decision_from_response
+from detect import make_detector
+from presence import PresenceTracker
+from metrics import MetricsExporter, Registry
+from i2c_bus import BusArbiter
+from readers import Reader
+from startup import Startup
+from buzzer import make_output
+from events import EventBus
+from logs import setup_logging
 
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # Configuration
 CONFIG = {
     'LED_PIN': board.D18,
     'LED_COUNT': 24,
+    'LED_GAMMA': 1.0,                     # e.g. 2.2 for perceptually even fades; 1.0 leaves colors as sent
     'SERVER_URL': 'http://127.0.0.1:8000',
     'DEVICE_NAME': 'Entrance',
-    'REQUEST_TIMEOUT': 5,
+    'REQUEST_TIMEOUT': 5,      # read timeout
+    'CONNECT_TIMEOUT': 2,
+    'KEEPALIVE_INTERVAL': 30,
+    'BREAKER_FAILURES': 2,          # failed taps/probes in a row before failing fast
+    'BREAKER_RESET_TIMEOUT': 5,     # seconds before a tap may try the server again
+    'HEALTH_CHECK_INTERVAL': 10,    # server/network probes while all is well
+    'HEALTH_PROBE_INTERVAL': 2,     # and while the server is down
+    'HEALTH_CHECK_TIMEOUT': 2,
+    'UPSTREAM_CHECK': ('1.1.1.1', 53),
+    'OFFLINE_QUEUE_PATH': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'offline_taps.db'),
+    'OFFLINE_QUEUE_MAX': 10000,
+    'OFFLINE_BULK_PATH': '/tap/bulk',
+    'PREDICTION_TTL': 300,
+    'PROGRAM_DIR': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs'),
+    'PROGRAM_PATH': '/animations/{}',  # formatted with the program's content hash
+    'TELEMETRY_PATH': '/telemetry',
+    'TELEMETRY_HEARTBEAT': 900,      # report at least this often (seconds)
+    'TELEMETRY_CHECK_INTERVAL': 15,
+    'TELEMETRY_PIGGYBACK_WAIT': 30,  # wait this long for a tap to carry a due report
     'BATTERY_CHECK_INTERVAL': 60,
+    'BATTERY_SAMPLE_INTERVAL': 2,
     'ADC_GAIN': 1,
-    'BATTERY_MIN_VOLTAGE': 3.0,
-    'BATTERY_MAX_VOLTAGE': 4.1,
+    'BATTERY_INTERNAL_RESISTANCE': 0.15,  # ohms, cell plus wiring
+    'LED_CHANNEL_CURRENT': 0.02,          # amps per LED channel at full scale
     'BATTERY_WARNING_VOLTAGE': 3.3,
     'PN532_RESET_PIN': board.D4,
     'BUZZER_PIN': board.D17,
+    'BUZZER_PWM': False,        # True for a passive buzzer on a PWM pin (GPIO12/13/19; 18 drives the LEDs)
+    'PN532_IRQ_PIN': None,      # BCM number of the PN532 IRQ line, if wired
+    'SHUTDOWN_BUTTON_PIN': None,  # BCM, active low, e.g. 26; not 2/3 (I2C). None if there is no button
+    'SHUTDOWN_COMMAND': None,   # e.g. ['sudo', 'shutdown', 'now'], run on a long press
+    'BUTTON_DEBOUNCE': 0.03,
+    'BUTTON_LONG_PRESS': 2.0,   # held this long: long press
+    'BUTTON_MULTI_WINDOW': 0.4,  # presses this close together count as one multi-press
+    'IDLE_AFTER': 300,               # seconds without a tap or button press before saving power
+    'IDLE_POLL_INTERVAL': 1.0,       # longest gap between PN532 polls while idle (IRQ readers sleep anyway)
+    'IDLE_BATTERY_SAMPLE_INTERVAL': 30,
+    'IDLE_TELEMETRY_CHECK_INTERVAL': 120,
+    'IDLE_TELEMETRY_HEARTBEAT': 3600,
+    'IDLE_HEALTH_CHECK_INTERVAL': 60,
+    'IDLE_KEEPALIVE_INTERVAL': 120,
+    'IDLE_LED_BRIGHTNESS': 30,       # cap for anything shown while idle, e.g. the low battery alert
+    'NFC_READ_TIMEOUT': 0.5,
+    'POLL_MIN_INTERVAL': 0.0,
+    'POLL_MAX_INTERVAL': 0.1,
+    'PRESENCE_HOLD_WINDOW': 1.0,   # same card still in the field
+    'RETAP_WINDOW': 0.5,           # same card back after a flicker
+    'METRICS_FILE': '/dev/shm/jas_tap.prom',  # tmpfs, rewritten every METRICS_INTERVAL
+    'METRICS_PORT': None,          # e.g. 9108 to serve /metrics on localhost
+    'METRICS_INTERVAL': 10,
+    'RUNTIME': 'threads',      # or 'asyncio'
+    'LOG_LEVEL': 'INFO',             # 'DEBUG' adds per-tap detail (sounds, decisions, timings)
+    'LOG_CONSOLE_LEVEL': 'WARNING',  # what reaches stderr/journald, i.e. the SD card
+    'LOG_FILE': '/dev/shm/jas_tap.log',  # tmpfs ring of everything at LOG_LEVEL
+    'LOG_BUFFER_RECORDS': 2000,      # recent records kept in memory
+    'LOG_FLUSH_RECORDS': 200,        # written to LOG_FILE in batches of this many
+    'LOG_FLUSH_INTERVAL': 30,        # or at least this often (seconds); errors at once
+    'LOG_FILE_MAX_BYTES': 1024 * 1024,
+    # Readers on this controller. Empty means one PN532 on I2C, set up by the
+    # PN532_* keys above. Otherwise one dict per reader; every key is optional:
+    #   {'name': 'exit', 'device': 'Exit', 'bus': 'i2c', 'address': 0x24,
+    #    'reset_pin': board.D27, 'irq_pin': 22, 'leds': (12, 12)},
+    #   {'name': 'side', 'bus': 'spi', 'cs_pin': board.D5, 'leds': (0, 12)},
+    #   {'name': 'rc522', 'type': 'mfrc522', 'spi_device': 1, 'reset_pin': 25},
+    # 'device' is the name sent to the server (DEVICE_NAME by default) and
+    # 'leds' a (first LED, count) segment of the ring (the whole ring by default).
+    # MFRC522 readers are always polled, take a BCM reset pin and report cards
+    # by the number read.py used to send.
+    'READERS': [],
 }
 
-class DeviceController:
-    def __init__(self):
-        self.brightness = 100   # default full brightness
-        self.tapSound = True
-        self.statusSound = False
-        self.soundDuration = 10
-
-        # Initialize LED hardware first
-        self.pixels = neopixel.NeoPixel(
-            CONFIG['LED_PIN'],
-            CONFIG['LED_COUNT'],
-            auto_write=False
-        )
-        
-        # Now we can call LED methods
-        self.off_led()  # Turn off LEDs initially
-        self.buzzer = DigitalInOut(CONFIG['BUZZER_PIN'])
-        self.buzzer.switch_to_output(value=False) 
-        
-        # Show startup animation
-        self.spinner_animation(color="000000255", duration=0.5)
-        
-        # Initialize I2C bus
-        self.i2c = busio.I2C(board.SCL, board.SDA, frequency=100000)
-        
-        # Initialize battery monitor
-        self._init_battery()
-        voltage, percentage = self._read_battery()
-        logger.info(f"Initial battery: {voltage:.2f}V ({percentage}%)")
-        self._show_battery_level(percentage)
-        
-        # Initialize NFC Procurement structures.
-        self._init_nfc()
-        
-        # Start battery monitoring thread
-        self.battery_monitor_active = True
-        self.battery_thread = threading.Thread(target=self._battery_monitor)
-        self.battery_thread.daemon = True
-        self.battery_thread.start()
-
-        # System readya
-        self.spinner_animation(color="000255000", duration=0.5)
-        logger.info("System initialized")
-
-    def apply_brightness(self, color):
-        """Scale an RGB color by the current brightness (0–100)."""
-        scale = self.brightness / 100.0
-        r, g, b = color
-        return (int(r * scale), int(g * scale), int(b * scale))
-
-
-    # LED Control Methods (defined first)
-    def off_led(self):
-        """Turn off all LEDs."""
-        self.pixels.fill((0, 0, 0))
-        self.pixels.show()
-        
-    def parse_color(self, color_str):
-        """Parse color string and apply brightness."""
-        try:
-            red = int(color_str[:3])
-            green = int(color_str[3:6])
-            blue = int(color_str[6:])
-            return self.apply_brightness((red, green, blue))
-        except (ValueError, IndexError):
-            logger.error(f"Invalid color string: {color_str}")
-            return (0, 0, 0)
-
-        
-
-
-    def wheel(self, pos):
-        """Generate rainbow colors across 0?255 positions."""
-        if pos < 85:
-            return (int(pos * 3), int(255 - pos * 3), 0)
-        elif pos < 170:
-            pos -= 85
-            return (int(255 - pos * 3), 0, int(pos * 3))
-        else:
-            pos -= 170
-            return (0, int(pos * 3), int(255 - pos * 3))
-
-    def rainbow_animation(self, duration_ms=2000):
-        """
-        Show a fast spinning rainbow across all LEDs for 'duration_ms' milliseconds.
-        1000 = 1 second.
-        """
-        num_pixels = len(self.pixels)
-        start_time = time.time()
-        duration_s = duration_ms / 1000.0
-
-        wait = 0.005  # fast but visible (smaller = faster)
-
-        while (time.time() - start_time) < duration_s:
-            for j in range(0, 255, 8):  # step of 8 = visible rotation speed
-                for i in range(num_pixels):
-                    color = self.wheel((int(i * 256 / num_pixels) + j) & 255)
-                    self.pixels[i] = self.apply_brightness(color)
-                self.pixels.show()
-                time.sleep(wait)
-                if (time.time() - start_time) > duration_s:
-                    break
-
-        # Fade out gracefully
-        for b in range(255, -1, -20):
-            for i in range(num_pixels):
-                r, g, bl = self.pixels[i]
-                self.pixels[i] = self.apply_brightness((int(r * b / 255), int(g * b / 255), int(bl * b / 255)))
-            self.pixels.show()
-            time.sleep(0.01)
-
-        self.pixels.fill((0, 0, 0))
-        self.pixels.show()
-
+# Log calls only queue the record; a writer thread formats it, keeps it in
+# the tmpfs ring and passes warnings and errors on to stderr
+log_pipeline = setup_logging(
+    level=CONFIG['LOG_LEVEL'],
+    console_level=CONFIG['LOG_CONSOLE_LEVEL'],
+    path=CONFIG['LOG_FILE'],
+    capacity=CONFIG['LOG_BUFFER_RECORDS'],
+    batch_size=CONFIG['LOG_FLUSH_RECORDS'],
+    flush_interval=CONFIG['LOG_FLUSH_INTERVAL'],
+    max_bytes=CONFIG['LOG_FILE_MAX_BYTES']
+)
 
 
-        
-    def split_animation(self, color, duration):
-        num_pixels = len(self.pixels)
-        color_rgb = self.parse_color(color)
-        delay = (duration / 1000) / (num_pixels // 2)
+def _gpio():
+    """RPi.GPIO, or None off a Pi"""
+    try:
+        import RPi.GPIO as GPIO
+        return GPIO
+    except (ImportError, RuntimeError):
+        return None
+
+
+def reader_specs():
+    """CONFIG['READERS'] with defaults filled in."""
+    specs = CONFIG['READERS'] or [{
+        'reset_pin': CONFIG['PN532_RESET_PIN'],
+        'irq_pin': CONFIG['PN532_IRQ_PIN'],
+    }]
+    # Polling holds the bus for the whole read, so PN532s sharing I2C poll in short slices
+    # (an MFRC522 is on SPI whatever its spec says)
+    def on_i2c(spec):
+        return spec.get('type', 'pn532') == 'pn532' and spec.get('bus', 'i2c') == 'i2c'
+
+    shared_i2c = sum(1 for spec in specs if on_i2c(spec)) > 1
+    short_timeout = min(CONFIG['NFC_READ_TIMEOUT'], 0.1)
+    return [dict({
+        'name': f"reader{i}",
+        'device': CONFIG['DEVICE_NAME'],
+        'type': 'pn532',
+        'bus': 'i2c',
+        'address': 0x24,
+        'cs_pin': None,
+        'spi_device': 0,
+        'reset_pin': None,
+        'irq_pin': None,
+        'leds': None,
+        'read_timeout': short_timeout if shared_i2c and on_i2c(spec) else CONFIG['NFC_READ_TIMEOUT'],
+    }, **spec) for i, spec in enumerate(specs)]
 
-        # Start full
-        self.pixels.fill(self.apply_brightness(color_rgb))
-        self.pixels.show()
-        time.sleep(0.2)
 
-        half = num_pixels // 2  # 12
-        steps = half - 1        # we exclude 0 and 12 (the verticals)
+class DeviceController:
+    def __init__(self, use_asyncio=False):
+        """
+        Brings the device up in stages, NFC first.
+
+        The reader is reset and configured on this thread while the LEDs,
+        battery monitor and network services start on the startup pool;
+        with the threaded runtime the readers start polling as soon as they
+        are up, and taps seen before the rest is ready wait for it. With
+        use_asyncio the background work is left for AsyncRuntime to
+        schedule as tasks instead of being started on threads here.
+        """
+        self.use_asyncio = use_asyncio
+        self.started = time.monotonic()
+        self.startup = Startup(_imports_started)
+        self.startup.phases["imports"] = (0.0, self.started - _imports_started)
+        self.runtime = None
+        self.brightness = 100   # for the device's own animations; taps use the decision's
+        self.tapSound = True    # from the last response: the beep comes before the server answers
+        self.ready = threading.Event()  # Set once everything a tap needs is up
+        self.reader_specs = reader_specs()
+        self.renderer = None
+        self.segment_renderers = {}
+        self.menu_step = 0      # Admin menu position, advanced by each admin tap
+        self.hotspot_on = False
+        # GPIO edges, buttons and card reads; the PN532 IRQ line is watched through it
+        self.events = EventBus(gpio=_gpio())
+        self.events.start()
+
+        leds = self.startup.background("leds", self._init_leds)
+
+        with self.startup.phase("nfc"):
+            self.i2c = busio.I2C(board.SCL, board.SDA, frequency=100000)
+            # Every device transaction goes through the arbiter; NFC first
+            self.bus = BusArbiter()
+            self.spi = None  # Set up if an SPI reader is configured
+            self._init_nfc(leds)
+        if not use_asyncio:
+            # Taps from every reader are handled here, as many at once as there are readers
+            self.dispatch_executor = ThreadPoolExecutor(
+                max_workers=len(self.readers), thread_name_prefix="dispatch"
+            )
+            for reader in self.readers:
+                reader.start(self._dispatch)
+            self.startup.mark("polling")
 
-        for i in range(steps // 2 + 1):
-            # right side (clockwise from top)
-            right_index = 1 + i
-            # left side (counterclockwise from top)
-            left_index = (num_pixels - 1) - i
+        if use_asyncio:
+            from async_runtime import AsyncBuzzer as Buzzer
+        else:
+            from buzzer import Buzzer
+        self.buzzer = Buzzer(make_output(CONFIG['BUZZER_PIN'], pwm=CONFIG['BUZZER_PWM']))
+        self.buzzer.start()
+        self.startup.background("battery", self._init_battery)
+        self.startup.background("services", self._init_services)
+        self.startup.wait()
+
+        for reader in self.readers:
+            reader.renderer = self.segment_renderers.get(tuple(reader.leds or ()), self.renderer)
+        if not use_asyncio:
+            self.battery.start()
+            # Start battery monitoring thread
+            self.battery_monitor_active = True
+            self.battery_thread = threading.Thread(target=self._battery_monitor)
+            self.battery_thread.daemon = True
+            self.battery_thread.start()
+
+        self._init_buttons()
+        self._init_power()
+        self._init_metrics()
+        self.ready.set()
+        self.startup.mark("ready")
+
+        # Cosmetic: battery level, then the ready spinner (queued, not preempting)
+        voltage, percentage = self._read_battery()
+        logger.info(f"Initial battery: {voltage:.2f}V ({percentage}%)")
+        self._show_battery_level(percentage, preempt=False)
+        self.spinner_animation(color="000255000", duration=0.5, preempt=False)
+        logger.info(f"System initialized: {self.startup.stats()}")
 
-            # also their mirrored counterparts on the bottom half
-            right_mirror = (half + right_index) % num_pixels
-            left_mirror = (half + left_index) % num_pixels
+    def _init_leds(self):
+        """Set up the ring and its renderers, and show the boot spinner"""
+        import neopixel
+        from render import LedRenderer, PixelSegment, RendererGroup
 
-            for idx in [right_index, left_index, right_mirror, left_mirror]:
-                self.pixels[idx] = self.apply_brightness((0, 0, 0))
+        self.pixels = neopixel.NeoPixel(
+            CONFIG['LED_PIN'],
+            CONFIG['LED_COUNT'],
+            auto_write=False
+        )
 
-            self.pixels.show()
-            time.sleep(delay)
+        # The renderer owns the pixels from here on; LED methods just queue jobs.
+        # Readers with their own LED segment get a renderer per segment, and
+        # system-wide animations play on all of them.
+        if self.use_asyncio:
+            from async_runtime import AsyncLedRenderer as Renderer
+        else:
+            Renderer = LedRenderer
+        segments = sorted({tuple(spec['leds']) for spec in self.reader_specs if spec['leds']})
+        if segments:
+            lock = threading.Lock()
+            segment_renderers = {
+                segment: Renderer(PixelSegment(self.pixels, *segment, lock), gamma=CONFIG['LED_GAMMA'])
+                for segment in segments
+            }
+            renderer = RendererGroup(segment_renderers.values())
+        else:
+            segment_renderers = {}
+            renderer = Renderer(self.pixels, gamma=CONFIG['LED_GAMMA'])
+        renderer.start()
+        self.segment_renderers = segment_renderers
+        self.renderer = renderer
+        self.off_led()  # Turn off LEDs initially
+        # Show startup animation (startup animations queue up rather than preempt)
+        self.spinner_animation(color="000000255", duration=0.5, preempt=False)
+
+    def _init_services(self):
+        """HTTP client, offline queue, telemetry, animation programs and the decision cache"""
+        from connectivity import CircuitBreaker, ConnectivityMonitor
+        from http_client import HttpClient
+        from programs import ProgramStore
+        from tap_queue import OfflineTapQueue
+        from telemetry import Telemetry
+
+        # Keep-alive HTTP client for taps (warms up in the background), and
+        # one on a separate pool for everything else, so a tap never waits
+        # for a socket held by a health check, drain or program fetch
+        self.http = HttpClient(
+            CONFIG['SERVER_URL'],
+            connect_timeout=CONFIG['CONNECT_TIMEOUT'],
+            read_timeout=CONFIG['REQUEST_TIMEOUT'],
+            keepalive_interval=CONFIG['KEEPALIVE_INTERVAL']
+        )
+        self.background_http = self.http.background()
+        if not self.use_asyncio:
+            self.http.start()
+
+        # Fail fast while the server is down; a background monitor keeps
+        # server and network reachability cached and probes for recovery
+        self.breaker = CircuitBreaker(
+            failure_threshold=CONFIG['BREAKER_FAILURES'],
+            reset_timeout=CONFIG['BREAKER_RESET_TIMEOUT']
+        )
+        self.connectivity = ConnectivityMonitor(
+            self.background_http,
+            self.breaker,
+            upstream=CONFIG['UPSTREAM_CHECK'],
+            interval=CONFIG['HEALTH_CHECK_INTERVAL'],
+            probe_interval=CONFIG['HEALTH_PROBE_INTERVAL'],
+            timeout=CONFIG['HEALTH_CHECK_TIMEOUT']
+        )
+        online = lambda: self.breaker.state != CircuitBreaker.OPEN
+
+        # Taps the server couldn't take are kept on disk and replayed later
+        self.offline_queue = OfflineTapQueue(
+            CONFIG['OFFLINE_QUEUE_PATH'],
+            self.background_http,
+            CONFIG['DEVICE_NAME'],
+            bulk_path=CONFIG['OFFLINE_BULK_PATH'],
+            max_rows=CONFIG['OFFLINE_QUEUE_MAX'],
+            online=online
+        )
+        self.breaker.listeners.append(self._circuit_changed)
+        if not self.use_asyncio:
+            self.offline_queue.start()
+            self.connectivity.start()
+
+        # Status reports go out on change or heartbeat, on a tap where possible
+        self.telemetry = Telemetry(
+            self.background_http,
+            CONFIG['DEVICE_NAME'],
+            sources={
+                "battery": lambda: self.battery.latest()[1],
+                "voltage": lambda: self.battery.latest()[0],
+                "reader_errors": lambda: sum(r.detector.errors for r in self.readers),
+                "queue_depth": self.offline_queue.depth,
+                "uptime": lambda: int(time.monotonic() - self.started),
+            },
+            thresholds={"battery": 2, "voltage": 0.05, "reader_errors": 1, "queue_depth": 10},
+            path=CONFIG['TELEMETRY_PATH'],
+            heartbeat=CONFIG['TELEMETRY_HEARTBEAT'],
+            interval=CONFIG['TELEMETRY_CHECK_INTERVAL'],
+            piggyback_wait=CONFIG['TELEMETRY_PIGGYBACK_WAIT'],
+            online=online
+        )
+        if not self.use_asyncio:
+            self.telemetry.start()
 
-        # Finally, turn off 0 and 12
-        self.pixels[0] = (0, 0, 0)
-        self.pixels[half] = (0, 0, 0)
-        self.pixels.show()
+        # Keyframe animations the server refers to by hash, kept on disk
+        self.programs = ProgramStore(CONFIG['PROGRAM_DIR'], self.background_http, path=CONFIG['PROGRAM_PATH'])
 
+        # Last server decision per card, replayed instantly on the next tap
+        self.predictions = DecisionCache(ttl=CONFIG['PREDICTION_TTL'])
 
+        if not self.use_asyncio:
+            self.tap_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tap")
 
-    
-    def spinner_animation(self, duration=1000, wait=0.01, color="000000255"):
+    # LED Control Methods (rendering happens on the renderer thread)
+    def off_led(self):
+        """Turn off all LEDs."""
+        self.renderer.play("off")
+
+    def _frame_clocks(self):
+        """Each renderer's frame clock, by the LEDs it drives."""
+        if self.segment_renderers:
+            return {
+                f"{start}-{start + count - 1}": renderer.clock
+                for (start, count), renderer in self.segment_renderers.items()
+            }
+        return {"ring": self.renderer.clock}
+
+    def _leds(self, reader=None):
+        """The renderer for a reader's LED segment, or for the whole ring."""
+        return reader.renderer if reader is not None else self.renderer
+
+    def spinner_animation(self, duration=1000, wait=0.01, color="000000255", preempt=True, reader=None):
         """Show a spinner animation."""
-        start_time = time.time()
-        color_rgb = self.parse_color(color)
-        while (time.time() - start_time) < (duration/1000):
-            for i in range(CONFIG['LED_COUNT']):
-                self.pixels.fill((0, 0, 0))
-                self.pixels[i] = self.apply_brightness(color_rgb)
-                self.pixels.show()
-                time.sleep(wait)
-        self.off_led()
-    
-    def control_led(self, color_str, duration_ms):
+        self._leds(reader).play("spin", color, duration, self._led_brightness(), wait, preempt=preempt)
+
+    def control_led(self, color_str, duration_ms, reader=None):
         """Control LED with specified color and duration."""
-        color = self.parse_color(color_str)
-        duration = duration_ms / 1000
-        self.pixels.fill(self.apply_brightness(color))
-        self.pixels.show()
-        time.sleep(duration)
-        self.off_led()
-
-    def play_animation(self, animation_type="solid", color="000000255", duration=1000):
-        if animation_type == "solid":
-            self.control_led(color, duration)
-        elif animation_type == "spin":
-            self.spinner_animation(duration=duration, color=color)
-        elif animation_type == "split":
-            self.split_animation(color, duration)
-        else:
-            self.rainbow_animation(duration)
+        self._leds(reader).play("solid", color_str, int(duration_ms), self._led_brightness())
 
+    def play_animation(self, animation_type="solid", color="000000255", duration=1000, reader=None,
+                       brightness=None):
+        """Queue an animation, cutting off the one currently playing."""
+        self._leds(reader).play(animation_type, color, int(duration), self._led_brightness(brightness))
 
-    def _show_battery_level(self, percentage):
+    def _show_battery_level(self, percentage, preempt=True, reader=None):
         """Visual indication of battery level"""
-        if percentage > 60:
-            color = (0, 255, 0)  # Green
-        elif percentage > 30:
-            color = (255, 255, 0)  # Yellow
-        else:
-            color = (255, 0, 0)  # Red
-            
-        lit_leds = int(CONFIG['LED_COUNT'] * percentage / 100)
-        self.pixels.fill((0, 0, 0))
-        for i in range(lit_leds):
-            self.pixels[i] = self.apply_brightness(color)
-        self.pixels.show()
-        time.sleep(2)
-        self.off_led()
+        self._leds(reader).play("battery", percentage, self._led_brightness(), preempt=preempt)
 
     # Battery Monitoring Methods
     def _init_battery(self):
         """Initialize ADS1115 battery monitor"""
+        import adafruit_ads1x15.ads1115 as ADS
+        from adafruit_ads1x15.analog_in import AnalogIn
+        from battery import BatterySampler
+
         for attempt in range(3):
             try:
-                self.ads = ADS.ADS1115(self.i2c, gain=CONFIG['ADC_GAIN'])
-                self.battery_channel = AnalogIn(self.ads, ADS.P0)
-                _ = self.battery_channel.voltage  # Test read
+                with self.bus.claim("battery"):
+                    ads = ADS.ADS1115(self.i2c, gain=CONFIG['ADC_GAIN'])
+                self.ads = self.bus.wrap(ads, "battery")
+                self.battery_channel = self.bus.wrap(AnalogIn(ads, ADS.P0), "battery")
+                self.battery = BatterySampler(
+                    self.ads,
+                    self.battery_channel,
+                    interval=CONFIG['BATTERY_SAMPLE_INTERVAL'],
+                    internal_resistance=CONFIG['BATTERY_INTERNAL_RESISTANCE'],
+                    load=self._led_current
+                )
                 return
             except Exception as e:
                 if attempt == 2:
@@ -256,55 +411,26 @@ class DeviceController:
                     raise
                 time.sleep(0.5)
 
-    def _read_battery(self):
-        """Read battery voltage and percentage"""
-        try:
-            voltage = self.battery_channel.voltage
-            percentage = int((voltage - CONFIG['BATTERY_MIN_VOLTAGE']) / 
-                         (CONFIG['BATTERY_MAX_VOLTAGE'] - CONFIG['BATTERY_MIN_VOLTAGE']) * 100)
-            percentage = max(0, min(100, percentage))
-            return voltage, percentage
-        except Exception as e:
-            logger.error(f"Battery read error: {str(e)}")
-            return None, None
+    def _led_current(self):
+        """Estimated LED current draw in amps, for the battery's load compensation"""
+        renderer = self.renderer
+        return renderer.lit * CONFIG['LED_CHANNEL_CURRENT'] if renderer is not None else 0.0
 
-    def _send_battery_status(self, percentage):
-        """Send battery percentage to server"""
-        try:
-            url = f"{CONFIG['SERVER_URL']}/battery/{percentage}"
-            response = requests.get(url, timeout=CONFIG['REQUEST_TIMEOUT'])
-            response.raise_for_status()
-            logger.info(f"Battery status sent: {percentage}%")
-            return True
-        except RequestException as e:
-            logger.error(f"Failed to send battery status: {str(e)}")
-            return False
+    def _read_battery(self):
+        """Latest filtered battery voltage and percentage (no I2C access)"""
+        return self.battery.latest()
 
     def _low_battery_warning(self):
-        """Visual low battery alert"""
-        for _ in range(3):
-            self.pixels.fill((25, 5, 0))  # Orange
-            self.pixels.show()
-            time.sleep(0.05)
-            self.off_led()
-            time.sleep(0.05)
+        """Low battery alert, seen and heard (does not cut off a tap's feedback)"""
+        self.renderer.play("low_battery", self._led_brightness(), preempt=False)
+        self.buzzer.play("low_battery", preempt=False)
 
     def _battery_monitor(self):
-        """Background battery monitoring thread"""
-        # Send initial reading immediately
-        voltage, percentage = self._read_battery()
-        if percentage is not None:
-            self._send_battery_status(percentage)
-            if voltage < CONFIG['BATTERY_WARNING_VOLTAGE']:
-                self._low_battery_warning()
-        
-        # Regular monitoring loop
+        """Background battery monitoring thread (warnings only; levels go out as telemetry)"""
         while self.battery_monitor_active:
             voltage, percentage = self._read_battery()
-            if percentage is not None:
-                self._send_battery_status(percentage)
-                if voltage < CONFIG['BATTERY_WARNING_VOLTAGE']:
-                    self._low_battery_warning()
+            if voltage is not None and voltage < CONFIG['BATTERY_WARNING_VOLTAGE']:
+                self._low_battery_warning()
             
             for _ in range(CONFIG['BATTERY_CHECK_INTERVAL']):
                 if not self.battery_monitor_active:
@@ -312,41 +438,101 @@ class DeviceController:
                 time.sleep(1)
 
     # NFC Methods
-    def _init_nfc(self):
-        """Initialize PN532 NFC reader"""
-        self.spinner_animation(color="255255000", duration=0.3)  # Yellow
-        
-        reset_pin = DigitalInOut(CONFIG['PN532_RESET_PIN'])
-        reset_pin.switch_to_output(value=False)
-        time.sleep(0.1)
-        reset_pin.value = True
-        time.sleep(0.5)
-        
-        try:
-            self.pn532 = PN532_I2C(self.i2c, reset=reset_pin, debug=False)
-            
-            for attempt in range(3):
-                try:
-                    ic, ver, rev, support = self.pn532.firmware_version
-                    logger.info(f'PN532 v{ver}.{rev} initialized')
-                    self.pn532.SAM_configuration()
-                    self.spinner_animation(color="000255000", duration=0.2)
-                    return
-                except RuntimeError as e:
-                    if attempt == 2:
-                        raise
-                    time.sleep(0.5)
-        except Exception as e:
-            logger.error(f"NFC init failed: {str(e)}")
+    def _init_nfc(self, leds):
+        """Initialize the readers, several at once if there are several"""
+        if any(spec['bus'] == 'spi' and spec['type'] == 'pn532' for spec in self.reader_specs):
+            self.spi = busio.SPI(board.SCK, board.MOSI, board.MISO)
+            self.spi_bus = BusArbiter()
+
+        def open_reader(spec):
+            try:
+                return self._open_reader(spec)
+            except Exception as e:
+                logger.error(f"NFC init failed for {spec['name']}: {str(e)}")
+                return None
+
+        if len(self.reader_specs) > 1:
+            with ThreadPoolExecutor(max_workers=len(self.reader_specs), thread_name_prefix="nfc-init") as pool:
+                opened = list(pool.map(open_reader, self.reader_specs))
+        else:
+            opened = [open_reader(spec) for spec in self.reader_specs]
+        self.readers = [reader for reader in opened if reader is not None]
+
+        if not self.readers:
+            leds.result()
             self.control_led("255000000", 1000)
-            raise
+            time.sleep(1)  # Let the error flash play before we bail out
+            raise RuntimeError("No NFC reader could be initialized")
+
+        # The first reader (the only one on a single-reader setup)
+        self.pn532 = self.readers[0].driver
+        self.detector = self.readers[0].detector
+
+    def _open_reader(self, spec):
+        """Reset and configure one reader and wrap it in a Reader"""
+        presence = PresenceTracker(
+            hold_window=CONFIG['PRESENCE_HOLD_WINDOW'],
+            retap_window=CONFIG['RETAP_WINDOW']
+        )
+
+        if spec['type'] == 'mfrc522':
+            from rc522 import MFRC522Reader, legacy_id
+            driver = MFRC522Reader(spi_device=spec['spi_device'], pin_rst=spec['reset_pin'] or 25)
+            logger.info(f"MFRC522 initialized ({spec['name']})")
+            detector = make_detector(
+                driver,
+                min_interval=CONFIG['POLL_MIN_INTERVAL'],
+                max_interval=CONFIG['POLL_MAX_INTERVAL']
+            )
+            return Reader(spec['name'], spec['device'], driver, detector, presence, leds=spec['leds'],
+                          read_timeout=spec['read_timeout'], card_id=lambda uid: str(legacy_id(uid)))
+
+        # The driver pulses reset itself when it's constructed
+        reset_pin = DigitalInOut(spec['reset_pin']) if spec['reset_pin'] is not None else None
+
+        if spec['bus'] == 'spi':
+            from adafruit_pn532.spi import PN532_SPI
+            cs_pin = DigitalInOut(spec['cs_pin'])
+            with self.spi_bus.claim("nfc"):
+                pn532 = PN532_SPI(self.spi, cs_pin, reset=reset_pin, debug=False)
+            driver = self.spi_bus.wrap(pn532, "nfc")
+        else:
+            with self.bus.claim("nfc"):
+                pn532 = PN532_I2C(self.i2c, address=spec['address'], reset=reset_pin, debug=False)
+            driver = self.bus.wrap(pn532, "nfc")
+
+        for attempt in range(3):
+            try:
+                ic, ver, rev, support = driver.firmware_version
+                logger.info(f'PN532 v{ver}.{rev} initialized ({spec["name"]})')
+                driver.SAM_configuration()
+                break
+            except RuntimeError as e:
+                if attempt == 2:
+                    raise
+                time.sleep(0.1)
+
+        detector = make_detector(
+            driver,
+            irq_pin=spec['irq_pin'],
+            min_interval=CONFIG['POLL_MIN_INTERVAL'],
+            max_interval=CONFIG['POLL_MAX_INTERVAL'],
+            events=self.events
+        )
+        return Reader(spec['name'], spec['device'], driver, detector, presence, leds=spec['leds'],
+                      read_timeout=spec['read_timeout'])
 
     def _check_internet(self):
-        try:
-            requests.get("http://1.1.1.1", timeout=3)  # Fast & reliable
-            return True
-        except Exception:
-            return False
+        """Cached upstream reachability (see ConnectivityMonitor); never waits on the network"""
+        self.connectivity.refresh()
+        return bool(self.connectivity.internet_ok)
+
+    def _circuit_changed(self, state):
+        if state == "open":
+            logger.warning("Tap server down: taps go to the offline queue until it answers")
+        elif state == "closed":
+            logger.info("Tap server back: resuming normal taps")
+            self.offline_queue.retry_now()
 
 
     def _start_hotspot(self):
@@ -370,139 +556,421 @@ class DeviceController:
         except subprocess.CalledProcessError:
             return False
 
-    taps = 0
-    hotspot_on = False
-
-    def handle_card_button(self):
-        self.taps+=1
-        if self.taps == 0:
-            print("## Nothing to do 0")
-        elif self.taps == 1:
-            print("## CHECKING BATTERY 1")
+    def _init_buttons(self):
+        """The shutdown button: hold to power off; a press shows the battery, a double press the connection"""
+        if CONFIG['SHUTDOWN_BUTTON_PIN'] is None:
+            # Older builds defaulted to GPIO3, which is SCL; a button still wired there does nothing now
+            logger.warning("No shutdown button: set SHUTDOWN_BUTTON_PIN to the BCM pin it is wired to, "
+                           "e.g. 26 (not 2/3, the I2C lines)")
+            return
+        try:
+            self.events.add_button(
+                "shutdown",
+                CONFIG['SHUTDOWN_BUTTON_PIN'],
+                debounce=CONFIG['BUTTON_DEBOUNCE'],
+                long_press=CONFIG['BUTTON_LONG_PRESS'],
+                multi_window=CONFIG['BUTTON_MULTI_WINDOW']
+            )
+        except RuntimeError as e:
+            logger.warning(f"Shutdown button unavailable: {str(e)}; rewire it to a free pin such as BCM 26")
+            return
+        self.events.subscribe("shutdown.long", self._shutdown_pressed)
+        self.events.subscribe("shutdown.short", self._battery_pressed)
+        self.events.subscribe("shutdown.multi", self._connection_pressed)
+
+    def _init_power(self):
+        """Slow polling, sampling and check-ins down while nobody is tapping (see power.PowerManager)"""
+        from power import PowerManager
+        self.power = PowerManager(self.events, idle_after=CONFIG['IDLE_AFTER'], battery=self.battery)
+        for reader in self.readers:
+            if hasattr(reader.detector, "max_interval"):
+                self.power.throttle(f"poll-{reader.name}", reader.detector, "max_interval",
+                                    CONFIG['IDLE_POLL_INTERVAL'])
+        self.power.throttle("battery", self.battery, "interval", CONFIG['IDLE_BATTERY_SAMPLE_INTERVAL'])
+        self.power.throttle("telemetry", self.telemetry, "interval", CONFIG['IDLE_TELEMETRY_CHECK_INTERVAL'])
+        self.power.throttle("heartbeat", self.telemetry, "heartbeat", CONFIG['IDLE_TELEMETRY_HEARTBEAT'])
+        self.power.throttle("health", self.connectivity, "interval", CONFIG['IDLE_HEALTH_CHECK_INTERVAL'])
+        self.power.throttle("keepalive", self.http, "keepalive_interval", CONFIG['IDLE_KEEPALIVE_INTERVAL'])
+        self.power.start()
+
+    def _led_brightness(self, brightness=None):
+        """Brightness for the next animation (a decision's, or the device's), capped while idle"""
+        if brightness is None:
+            brightness = self.brightness
+        power = getattr(self, 'power', None)
+        if power is not None and power.idle:
+            return min(brightness, CONFIG['IDLE_LED_BRIGHTNESS'])
+        return brightness
+
+    def _shutdown_pressed(self, event):
+        logger.warning("Shutdown button held")
+        self.spinner_animation(color="255000000", duration=1.0)
+        if CONFIG['SHUTDOWN_COMMAND']:
+            subprocess.Popen(CONFIG['SHUTDOWN_COMMAND'])
+
+    def _battery_pressed(self, event):
+        voltage, percentage = self._read_battery()
+        if percentage is not None:
+            self._show_battery_level(percentage)
+
+    def _connection_pressed(self, event):
+        color = "000255000" if self.connectivity.server_ok else "255000000"  # Green: server reachable
+        self.spinner_animation(color=color, duration=0.5)
+
+    def handle_card_button(self, reader=None):
+        self.menu_step += 1
+        if self.menu_step == 0:
+            logger.info("Menu 0: nothing to do")
+        elif self.menu_step == 1:
+            logger.info("Menu 1: checking battery")
             voltage, percentage = self._read_battery()
-            if percentage < 5:
-                print("## LOW BATTERY")
-                self._low_battery_warning()
             if percentage is not None:
-                self._show_battery_level(percentage)
-        elif self.taps == 2:
-            print("## CHECKING INTERNET 2")
+                if percentage < 5:
+                    logger.info("Menu: low battery")
+                    self._low_battery_warning()
+                self._show_battery_level(percentage, reader=reader)
+        elif self.menu_step == 2:
+            logger.info("Menu 2: checking internet")
             if self._check_internet():
-                self.spinner_animation(color="000255000", duration=0.5)  # Green
+                self.spinner_animation(color="000255000", duration=0.5, reader=reader)  # Green
             else:
-                self.spinner_animation(color="255000000", duration=0.5)  # Red
+                self.spinner_animation(color="255000000", duration=0.5, reader=reader)  # Red
 
-        elif self.taps == 3:
-            print("## TOGGLE HOTSPOT 3")
+        elif self.menu_step == 3:
+            logger.info("Menu 3: toggling hotspot")
             if not self.hotspot_on:
-                print("### STARTING AP")
+                logger.info("Menu: starting access point")
                 self.hotspot_on = True
                 if self._start_hotspot():
-                    self.spinner_animation(color="000000255", duration=1.0)  # Blue = hotspot on
+                    self.spinner_animation(color="000000255", duration=1.0, reader=reader)  # Blue = hotspot on
                 else:
-                    self.spinner_animation(color="255000000", duration=1.0)  # Red = error
+                    self.spinner_animation(color="255000000", duration=1.0, reader=reader)  # Red = error
             else:
-                print("### STOPPING AP")
+                logger.info("Menu: stopping access point")
                 self.hotspot_on = False
                 if self._stop_hotspot():
-                    self.spinner_animation(color="255000055", duration=1.0)  # Blue = hotspot on
+                    self.spinner_animation(color="255000055", duration=1.0, reader=reader)  # Blue = hotspot on
                 else:
-                    self.spinner_animation(color="000000255", duration=1.0)  # Red = error
-            self.taps = 0  # Reset menu cycle
+                    self.spinner_animation(color="000000255", duration=1.0, reader=reader)  # Red = error
+            self.menu_step = 0  # Reset menu cycle
         else:
-            print("## RESETTING")
-            self.taps=0
-            self.spinner_animation(color="000000255", duration=0.5)
+            logger.info("Menu: resetting")
+            self.menu_step = 0
+            self.spinner_animation(color="000000255", duration=0.5, reader=reader)
+
+    def _status_sound(self, decision):
+        """The server's verdict on the buzzer: soundDuration is the length of the pattern's longest tone"""
+        pattern = "deny" if decision.card_type.lower() in ("denied", "unknown") else "success"
+        self.buzzer.play(pattern, length=decision.sound_duration)
 
-    def beep(self, duration=0.1):
-        """Short beep on the buzzer"""
 
+    def _dispatch(self, reader, card_id):
+        """Called from a reader's polling worker with each new tap."""
+        logger.info("Card detected on %s: %s", reader.name, card_id)
+        self.events.publish("card", reader.name, card_id=card_id)
+        self.dispatch_executor.submit(self._dispatch_tap, card_id, reader)
+
+    def _dispatch_tap(self, card_uid, reader):
+        self.ready.wait()  # A tap during startup is handled once the rest is up
         try:
-            self.buzzer.value = True   # Turn buzzer ON
-            time.sleep(duration)
-            self.buzzer.value = False  # Turn buzzer OFF
+            self.handle_card_tap(card_uid, reader)
         except Exception as e:
-            logger.error(f"Buzzer error: {str(e)}")
-
+            logger.error("Tap handling failed on %s: %s", reader.name, e)
 
-    def handle_card_tap(self, card_uid):
+    def handle_card_tap(self, card_uid, reader=None):
         """Handle NFC card tap event"""
-        if self.tapSound:
-            self.beep()
+        reader = reader or self.readers[0]
+        start, predicted = self._begin_tap(card_uid, reader)
+        if predicted is not None:
+            self.tap_executor.submit(self._confirm_tap, card_uid, predicted, time.monotonic(), reader)
+        else:
+            self._tap_now(card_uid, reader)
+        self._end_tap(start)
 
-        url = f"{CONFIG['SERVER_URL']}/tap"
-        data = {"device": CONFIG['DEVICE_NAME'], "card": card_uid}
-        
+    # The stages of a tap. handle_card_tap and AsyncRuntime._handle_tap both run
+    # them; they differ only in where _confirm_tap and _tap_now run.
+
+    def _begin_tap(self, card_uid, reader):
+        """
+        Count the tap, wake the device and beep, then show the cached decision
+        if there is one. Returns the start time and that decision (or None):
+        with one, _confirm_tap checks it with the server; without, _tap_now asks.
+        """
+        start = time.perf_counter()
+        self.taps_total.inc()
+        self.power.activity()
+        if self.tapSound:
+            self.buzzer.play("tap")
+            self.tap_stages["beep"].observe(time.perf_counter() - start)
+
+        predicted = self.predictions.lookup((reader.device, card_uid))
+        if predicted is not None:
+            # Show what the server said last time and check it in the background
+            self._show_decision(predicted, reader)
+        return start, predicted
+
+    def _end_tap(self, start):
+        """Record the tap's total time, once its feedback is showing."""
+        self.tap_stages["total"].observe(time.perf_counter() - start)
+
+    def _tap_now(self, card_uid, reader):
+        """Ask the server about a tap and show its answer."""
+        from requests.exceptions import RequestException
         try:
-            response = requests.post(
-                url,
-                json=data,
-                timeout=CONFIG['REQUEST_TIMEOUT']
-            )
+            self._show_decision(self._request_tap(card_uid, reader), reader)
+        except RequestException as e:
+            self._tap_failed(card_uid, e, reader)
+
+    def _request_tap(self, card_uid, reader):
+        """Send the tap to the server and return its decision."""
+        data = {"device": reader.device, "card": card_uid}
+        report = self.telemetry.attach()
+        if report is not None:
+            data["telemetry"] = report
+        # While the server is down this fails at once, and the tap goes offline
+        with self.breaker.guard():
+            start = time.perf_counter()
+            response = self.http.post("/tap", json=data, name="tap")
+            parse_start = time.perf_counter()
+            self.tap_stages["http"].observe(parse_start - start)
             response.raise_for_status()
-            
-            response_data = response.json()
-            logger.info(f"Server response: {response_data}")
-            
-            color_str = response_data.get("color", "000000000")
-            duration_ms = response_data.get("duration", 1000)
-            card_type = response_data.get("card_type", "acess")
-            animation = response_data.get("animation", "rainbow")
-            brightness = response_data.get("brightness", 100)
-
-            self.tapSound = response_data.get("tapSound", True)
-            self.statusSound = response_data.get("statusSound", False)
-            self.soundDuration = response_data.get("soundDuration", 0.01)
-            print(self.soundDuration)
-            print(self.tapSound)
-            print(self.statusSound)
-            
-            if brightness > 100:
-                brightness = 100
-            elif brightness < 0:
-                brightness = 0
-            self.brightness = brightness
-
+        if report is not None:
+            self.telemetry.sent(report)
+
+        response_data = response.json()
+        logger.info("Server response: %s", response_data)
+
+        self.tapSound = response_data.get("tapSound", True)
+        decision = decision_from_response(response_data)
+        logger.debug("Sounds: tap=%s status=%s duration=%s",
+                     self.tapSound, decision.status_sound, decision.sound_duration)
+        self.tap_stages["parse"].observe(time.perf_counter() - parse_start)
+        key = (reader.device, card_uid)
+        if decision.card_type.upper() == "ADMIN":
+            self.predictions.forget(key)  # Menu actions are never speculated
+        else:
+            self.predictions.store(key, decision)
+        return decision
 
-            if card_type.upper() == "ADMIN":
-                self.handle_card_button()
+    def _show_decision(self, decision, reader):
+        start = time.perf_counter()
+        if decision.card_type.upper() == "ADMIN":
+            self.handle_card_button(reader)
+        else:
+            logger.debug("Showing %s color=%s duration=%s", decision.animation, decision.color, decision.duration)
+            program = self.programs.get(decision.program) if decision.program else None
+            if program is not None:
+                self._leds(reader).play("program", program, self._led_brightness(decision.brightness))
             else:
-                print(animation)
-                print(str(color_str))
-                print(int(duration_ms))
-                self.play_animation(animation, str(color_str), int(duration_ms))
-                self.taps = 0
-                if self.statusSound:
-                    self.beep(duration=self.soundDuration)
-            
+                # No program, or not fetched yet: the named effect stands in
+                self.play_animation(decision.animation, decision.color, decision.duration, reader=reader,
+                                    brightness=decision.brightness)
+            self.menu_step = 0
+            if decision.status_sound:
+                self._status_sound(decision)
+        self.tap_stages["animate"].observe(time.perf_counter() - start)
+
+    def _confirm_tap(self, card_uid, predicted, started, reader):
+        """Check a speculative tap with the server, correcting the LEDs if it disagrees."""
+        from requests.exceptions import RequestException
+        from tap_queue import never_delivered
+        try:
+            actual = self._request_tap(card_uid, reader)
         except RequestException as e:
-            logger.error(f"Server communication failed: {str(e)}")
-            self.control_led("255000000", 500)
+            if never_delivered(e):
+                # Server never saw it: the prediction stands and the tap is replayed later
+                self.offline_queue.put(card_uid, reader.device)
+                return
+            if e.response is None:
+                # Sent, but no usable answer (read timeout, bad body): the prediction stands
+                logger.warning("No answer for %s, keeping the prediction: %s", card_uid, e)
+                return
+            self.predictions.forget((reader.device, card_uid))
+            self.predictions.record_outcome(predicted, None, 0)
+            self._tap_failed(card_uid, e, reader)
+            return
+
+        self.predictions.record_outcome(predicted, actual, time.monotonic() - started)
+        if actual != predicted:
+            logger.info("Misprediction for %s, correcting feedback", card_uid)
+            self._show_decision(actual, reader)
+
+    def _tap_failed(self, card_uid, e, reader):
+        from tap_queue import never_delivered
+        logger.error("Server communication failed: %s", e)
+        # Only taps the server can't have recorded are replayed (see never_delivered)
+        if never_delivered(e):
+            self.offline_queue.put(card_uid, reader.device)
+        self.control_led("255000000", 500, reader=reader)
+
+    def _init_metrics(self):
+        """Register tap-stage histograms and device counters, and start exporting them."""
+        m = self.metrics = Registry()
+        self.tap_stages = {
+            stage: m.histogram("tap_stage_seconds", "Time spent in each stage of a tap", stage=stage)
+            for stage in ("detect", "beep", "http", "parse", "animate", "total")
+        }
+        for reader in self.readers:
+            reader.detector.observer = self.tap_stages["detect"].observe
+        self.renderer.observer = m.histogram(
+            "render_start_seconds", "Delay from queuing an animation to its first frame"
+        ).observe
+        self.battery.observer = m.histogram("battery_read_seconds", "ADS1115 read duration").observe
+        for phase in self.startup.phases:
+            m.gauge("startup_phase_seconds", "Duration of each startup phase",
+                    fn=lambda p=phase: self.startup.phases[p][1], phase=phase)
+        m.gauge("startup_ready_seconds", "From process start until taps are handled",
+                fn=lambda: self.startup.milestones.get("ready"))
+        self.taps_total = m.counter("taps_total", "Taps handled")
+        m.counter("taps_suppressed_total", "Repeat reads of a card still on the reader",
+                  fn=lambda: sum(r.presence.suppressed for r in self.readers))
+        bus_waits = {
+            name: m.histogram("i2c_wait_seconds", "Time a transaction waited for the I2C bus", device=name)
+            for name in ("nfc", "battery")
+        }
+        self.bus.observer = lambda name, waited: bus_waits[name].observe(waited)
+        if self.spi is not None:
+            spi_waits = m.histogram("spi_wait_seconds", "Time a transaction waited for the SPI bus")
+            self.spi_bus.observer = lambda name, waited: spi_waits.observe(waited)
+        for name in bus_waits:
+            m.counter("i2c_contended_total", "Transactions that had to wait for the I2C bus",
+                      fn=lambda name=name: self.bus.contended(name), device=name)
+        for reader in self.readers:
+            m.counter("reader_errors_total", "PN532 read errors", fn=lambda r=reader: r.detector.errors,
+                      reader=reader.name)
+        m.counter("i2c_errors_total", "I2C errors", fn=lambda: self.battery.errors, device="ads1115")
+        m.gauge("battery_voltage", "Filtered, load-compensated battery voltage",
+                fn=lambda: self.battery.latest()[0])
+        m.gauge("battery_percent", "Estimated charge", fn=lambda: self.battery.latest()[1])
+        m.gauge("battery_runtime_hours", "Estimated runtime left at the recent discharge rate",
+                fn=self.battery.runtime_hours)
+        m.rate("render_fps", "Frames pushed to the LED ring per second",
+               fn=lambda: self.renderer.frames_shown)
+        m.counter("render_frames_skipped_total", "Frames not sent because the ring already showed them",
+                  fn=lambda: self.renderer.frames_skipped)
+        m.counter("render_frames_dropped_total", "Frames dropped because their slot had passed",
+                  fn=lambda: self.renderer.frames_dropped)
+        for leds, clock in self._frame_clocks().items():
+            m.gauge("render_target_fps", "Frame rate the last animation asked for",
+                    fn=lambda c=clock: c.target_fps, leds=leds)
+            m.gauge("render_achieved_fps", "Frame rate the last animation got",
+                    fn=lambda c=clock: c.achieved_fps, leds=leds)
+            m.gauge("render_jitter_p99_ms", "99th percentile frame lateness over recent frames",
+                    fn=lambda c=clock: c.jitter().get("p99_ms"), leds=leds)
+        m.counter("log_records_dropped_total", "Log records dropped before they were written",
+                  fn=lambda: log_pipeline.dropped)
+        m.gauge("power_idle", "1 while the device is saving power", fn=lambda: int(self.power.idle))
+        for state in (self.power.ACTIVE, self.power.IDLE):
+            m.counter("power_state_seconds_total", "Time spent in each power state",
+                      fn=lambda s=state: self.power.stats()["states"][s]["seconds"], state=state)
+            m.gauge("battery_discharge_pct_per_hour", "Battery drain rate measured in each power state",
+                    fn=lambda s=state: self.power.stats()["states"][s]["pct_per_hour"], state=state)
+        m.gauge("offline_queue_depth", "Taps waiting to be replayed", fn=self.offline_queue.depth)
+        m.counter("offline_queue_rejected_total", "Offline taps the server refused and that were set aside",
+                  fn=lambda: self.offline_queue.rejected)
+        m.gauge("circuit_state", "Tap server circuit: 0 closed, 1 half-open, 2 open",
+                fn=lambda: ("closed", "half_open", "open").index(self.breaker.state))
+        m.counter("circuit_trips_total", "Times the tap server circuit opened",
+                  fn=lambda: self.breaker.trips)
+        m.counter("circuit_rejected_total", "Requests refused while the circuit was open",
+                  fn=lambda: self.breaker.rejected)
+        m.gauge("server_reachable", "Whether the last health check reached the tap server",
+                fn=lambda: None if self.connectivity.server_ok is None else int(self.connectivity.server_ok))
+        m.gauge("internet_reachable", "Whether the last health check reached the network",
+                fn=lambda: None if self.connectivity.internet_ok is None else int(self.connectivity.internet_ok))
+        m.counter("prediction_hits_total", "Taps answered from the decision cache",
+                  fn=lambda: self.predictions.hits)
+        m.counter("prediction_misses_total", "Taps with no cached decision to show",
+                  fn=lambda: self.predictions.misses)
+        m.counter("prediction_mispredictions_total", "Cached decisions the server overruled",
+                  fn=lambda: self.predictions.mispredictions)
+        m.counter("prediction_time_saved_seconds_total", "Server round trips hidden by correct predictions",
+                  fn=lambda: self.predictions.time_saved)
+
+        self.metrics_exporter = MetricsExporter(
+            m,
+            path=CONFIG['METRICS_FILE'],
+            port=CONFIG['METRICS_PORT'],
+            interval=CONFIG['METRICS_INTERVAL']
+        )
+        self.metrics_exporter.start(write_thread=not self.use_asyncio)
 
     def run(self):
-        """Main run loop"""
-        logger.info("Waiting for NFC cards...")
+        """Main run loop: each reader polls on its own worker (started during startup) and dispatches taps"""
+        logger.info(f"Waiting for NFC cards on {len(self.readers)} reader(s)...")
         while True:
-            uid = self.pn532.read_passive_target(timeout=0.5)
-            if uid is not None:
-                card_id = uid.hex()
-                logger.info(f"Card detected: {card_id}")
-                self.handle_card_tap(card_id)
-            time.sleep(0.1)
+            time.sleep(1)
+
+    def run_async(self):
+        """Main run loop on the asyncio runtime"""
+        from async_runtime import AsyncRuntime
+        AsyncRuntime(
+            self,
+            battery_interval=CONFIG['BATTERY_CHECK_INTERVAL'],
+            warning_voltage=CONFIG['BATTERY_WARNING_VOLTAGE']
+        ).run()
 
     def cleanup(self):
         """Clean up resources"""
         self.battery_monitor_active = False
         if hasattr(self, 'battery_thread') and self.battery_thread.is_alive():
             self.battery_thread.join()
-        self.off_led()
+        self.renderer.stop()
+        for leds, clock in self._frame_clocks().items():
+            logger.info(f"Frame clock {leds}: {clock.stats()}")
+        if hasattr(self, 'power'):
+            logger.info(f"Power: {self.power.stats()}")
+        if hasattr(self, 'events'):
+            self.events.stop()
+            logger.info(f"Events: {self.events.stats()}")
+        if hasattr(self, 'buzzer'):
+            self.buzzer.stop()
+            logger.info(f"Buzzer: {self.buzzer.stats()}")
+        if hasattr(self, 'battery'):
+            self.battery.stop()
+            logger.info(f"Battery: {self.battery.stats()}")
+        if hasattr(self, 'bus'):
+            logger.info(f"I2C bus: {self.bus.stats()}")
+        for reader in getattr(self, 'readers', []):
+            reader.stop()
+            logger.info(f"Reader {reader.name}: {reader.stats()}")
+        if hasattr(self, 'dispatch_executor'):
+            self.dispatch_executor.shutdown(wait=True)
+        if hasattr(self, 'tap_executor'):
+            self.tap_executor.shutdown(wait=True)
+        if hasattr(self, 'metrics_exporter'):
+            self.metrics_exporter.stop()
+        if hasattr(self, 'telemetry'):
+            self.telemetry.stop()
+            logger.info(f"Telemetry: {self.telemetry.stats()}")
+        if hasattr(self, 'programs'):
+            self.programs.close()
+            logger.info(f"Animation programs: {self.programs.stats()}")
+        if hasattr(self, 'predictions'):
+            logger.info(f"Prediction stats: {self.predictions.stats()}")
+        if hasattr(self, 'connectivity'):
+            self.connectivity.stop()
+            logger.info(f"Connectivity: {self.connectivity.stats()}")
+        if hasattr(self, 'offline_queue'):
+            self.offline_queue.stop()
+        if hasattr(self, 'http'):
+            logger.info(f"HTTP timings: {self.http.stats()}")
+            self.http.close()
+        if hasattr(self, 'background_http'):
+            logger.info(f"Background HTTP timings: {self.background_http.stats()}")
+            self.background_http.close()
         logger.info("Device shutdown complete")
+        logger.info(f"Logging: {log_pipeline.stats()}")  # Written out at exit
 
 if __name__ == "__main__":
     controller = None
     try:
-        controller = DeviceController()
-        controller.run()
+        use_asyncio = CONFIG['RUNTIME'] == 'asyncio'
+        controller = DeviceController(use_asyncio=use_asyncio)
+        if use_asyncio:
+            controller.run_async()
+        else:
+            controller.run()
     except KeyboardInterrupt:
         logger.info("Shutting down gracefully...")
         if controller:
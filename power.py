@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PowerManager:
+    """
+    Saves power while nobody is using the device.
+
+    After idle_after seconds without activity (any event on the bus, or
+    activity() from the tap path) every registered knob's save() runs:
+    slower polling, sampling and check-ins. The next activity runs the
+    restore()s straight away, on the caller's thread, so the tap that
+    woke the device is handled at full speed. The idle timer lives on the
+    event bus, so nothing polls for it.
+
+    Time and battery discharge (from battery.percentage, the filtered
+    ADS1115 reading) are added up per state, so stats() shows the drain
+    rate and the runtime it would give in each, once a state has been
+    measured for min_measure seconds.
+    """
+
+    ACTIVE = "active"
+    IDLE = "idle"
+
+    def __init__(self, events, idle_after=300, battery=None, min_measure=600):
+        self.events = events
+        self.idle_after = idle_after
+        self.battery = battery
+        self.min_measure = min_measure
+        self.state = self.ACTIVE
+        self.wakeups = 0
+        self._knobs = []  # (name, save, restore)
+        self._timer = None
+        self._lock = threading.Lock()
+        self._active_at = time.monotonic()
+        self._since = time.monotonic()
+        self._level = self._battery_level()
+        self._seconds = {self.ACTIVE: 0.0, self.IDLE: 0.0}
+        self._discharged = {self.ACTIVE: 0.0, self.IDLE: 0.0}  # percentage points
+
+    def add(self, name, save, restore):
+        self._knobs.append((name, save, restore))
+
+    def throttle(self, name, obj, attr, idle_value):
+        """A knob that sets obj.attr to idle_value while idle and back to its current value after."""
+        active_value = getattr(obj, attr)
+        self.add(name, lambda: setattr(obj, attr, idle_value), lambda: setattr(obj, attr, active_value))
+
+    def start(self):
+        self.events.subscribe("*", lambda event: self.activity())
+        self.events.call_soon(self._arm)
+
+    @property
+    def idle(self):
+        return self.state == self.IDLE
+
+    def activity(self):
+        """Something happened: back to full power now, and restart the idle timer. Any thread."""
+        with self._lock:
+            self._active_at = time.monotonic()
+            if self.state == self.IDLE:
+                self._set(self.ACTIVE)
+        self.events.call_soon(self._arm)
+
+    def _arm(self):
+        if self._timer is not None:
+            self.events.cancel(self._timer)
+        self._timer = self.events.call_later(self.idle_after, self._sleep)
+
+    def _sleep(self):
+        self._timer = None
+        with self._lock:
+            # Activity that raced the timer has re-armed it already; stay awake for that
+            if time.monotonic() - self._active_at < self.idle_after:
+                return
+            self._set(self.IDLE)
+
+    def _set(self, state):
+        """Switch state and run the knobs. Caller holds _lock."""
+        if state == self.state:
+            return
+        self._account()
+        self.state = state
+        if state == self.ACTIVE:
+            self.wakeups += 1
+        for name, save, restore in self._knobs:
+            try:
+                (save if state == self.IDLE else restore)()
+            except Exception as e:
+                logger.error(f"Power knob {name} failed: {str(e)}")
+        logger.info(f"Power: {state}")
+
+    def _battery_level(self):
+        return getattr(self.battery, "percentage", None)
+
+    def _account(self):
+        now = time.monotonic()
+        level = self._battery_level()
+        self._seconds[self.state] += now - self._since
+        if level is not None and self._level is not None:
+            self._discharged[self.state] += self._level - level
+        self._since = now
+        self._level = level
+
+    def stats(self):
+        with self._lock:
+            self._account()
+            level = self._level
+            states = {}
+            for state, seconds in self._seconds.items():
+                hours = seconds / 3600
+                # Percentages move in coarse steps; a rate over a few minutes would be noise
+                rate = self._discharged[state] / hours if seconds >= self.min_measure else None
+                states[state] = {
+                    "seconds": round(seconds),
+                    "discharged_pct": round(self._discharged[state], 2),
+                    "pct_per_hour": round(rate, 2) if rate is not None else None,
+                    # Hours the current charge would last if the device stayed in this state
+                    "runtime_hours": round(level / rate, 1) if rate and rate > 0 and level is not None else None,
+                }
+        return {"state": self.state, "wakeups": self.wakeups, "states": states}
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import namedtuple
+
+# program is the content hash of a keyframe animation (see programs.py), if any;
+# status_sound and sound_duration say whether and how long to sound the verdict
+TapDecision = namedtuple("TapDecision",
+                         "color animation duration card_type brightness program status_sound sound_duration",
+                         defaults=(None, False, 0.01))
+
+
+def decision_from_response(response_data):
+    """Pull the parts of a /tap response that drive feedback."""
+    brightness = response_data.get("brightness", 100)
+    return TapDecision(
+        color=str(response_data.get("color", "000000000")),
+        animation=response_data.get("animation", "rainbow"),
+        duration=int(response_data.get("duration", 1000)),
+        card_type=response_data.get("card_type", "acess"),
+        brightness=max(0, min(100, brightness)),
+        program=response_data.get("program"),
+        status_sound=bool(response_data.get("statusSound", False)),
+        sound_duration=response_data.get("soundDuration", 0.01),
+    )
+
+
+class DecisionCache:
+    """
+    Per-card cache of the server's last decision, used to predict the next one.
+
+    Entries expire after ttl seconds. Counters report how often a prediction
+    was available, how often the server disagreed and how much waiting for
+    the server the correct predictions saved.
+    """
+
+    def __init__(self, ttl=300, max_entries=2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.mispredictions = 0
+        self.time_saved = 0.0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, card_uid):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(card_uid)
+            if entry is not None and now - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[card_uid]
+            self.misses += 1
+            return None
+
+    def store(self, card_uid, decision):
+        with self._lock:
+            if card_uid not in self._entries and len(self._entries) >= self.max_entries:
+                # Evict the stalest entry rather than growing without bound
+                oldest = min(self._entries, key=lambda uid: self._entries[uid][1])
+                del self._entries[oldest]
+            self._entries[card_uid] = (decision, time.monotonic())
+
+    def forget(self, card_uid):
+        with self._lock:
+            self._entries.pop(card_uid, None)
+
+    def record_outcome(self, predicted, actual, waited):
+        """Score a prediction once the server's answer (or failure) is in."""
+        with self._lock:
+            if actual is not None and actual == predicted:
+                self.time_saved += waited
+            else:
+                self.mispredictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "mispredictions": self.mispredictions,
+                "time_saved_s": round(self.time_saved, 3),
+            }
@@ -0,0 +1,50 @@
+import time
+
+
+class PresenceTracker:
+    """
+    Tells a new tap apart from a card that is still sitting on the reader.
+
+    A UID counts as still present while it keeps being read within
+    hold_window seconds of its last read and no empty poll has been seen in
+    between. Once a poll comes back empty the card is taken as removed, and
+    the same UID coming back within retap_window seconds of its last read is
+    treated as the field flickering rather than a second tap.
+    """
+
+    def __init__(self, hold_window=1.0, retap_window=0.5):
+        self.hold_window = hold_window
+        self.retap_window = retap_window
+        self.present = None
+        self.taps = 0
+        self.suppressed = 0
+        self._last_seen = {}
+
+    def observe(self, uid, now=None):
+        """Record a read of uid. Returns True if it is a new tap."""
+        now = time.monotonic() if now is None else now
+        seen = self._last_seen.get(uid)
+        self._last_seen[uid] = now
+
+        if seen is not None:
+            window = self.hold_window if uid == self.present else self.retap_window
+            if now - seen <= window:
+                self.present = uid
+                self.suppressed += 1
+                return False
+
+        self.present = uid
+        self.taps += 1
+        if len(self._last_seen) > 256:
+            horizon = max(self.hold_window, self.retap_window)
+            self._last_seen = {
+                card: t for card, t in self._last_seen.items() if now - t <= horizon
+            }
+        return True
+
+    def absent(self):
+        """Record an empty poll: whatever card was on the reader has gone."""
+        self.present = None
+
+    def stats(self):
+        return {"taps": self.taps, "suppressed": self.suppressed}
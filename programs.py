@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+MAX_DURATION_MS = 10000
+MAX_KEYFRAMES = 64
+MAX_LOOPS = 20
+
+
+class Program:
+    """
+    A keyframe animation, identified by the SHA-256 of its JSON text.
+
+    The JSON is compact on purpose:
+
+        {"fps": 40, "loop": 2, "keyframes": [
+            [0, ["255000000"]],
+            [400, ["000000255", "000000000", "000000000"], 12],
+            [800, ["000000000"], 0, "step"]]}
+
+    Each keyframe is [time_ms, colors, shift, ease]. colors are 'RRRGGGBBB'
+    strings tiled round the ring, shift rotates the pattern by that many
+    pixels, and ease is "linear" (the default) or "step" for the segment
+    leading into the keyframe. The last keyframe is shown for one frame
+    and then the ring goes dark, so a program needs at least two
+    keyframes to last any time at all. See frames.compile_program.
+    """
+
+    __slots__ = ("digest", "fps", "loops", "keyframes")
+
+    def __init__(self, digest, fps, loops, keyframes):
+        self.digest = digest
+        self.fps = fps
+        self.loops = loops
+        self.keyframes = keyframes
+
+    def __hash__(self):
+        return hash(self.digest)
+
+    def __eq__(self, other):
+        return isinstance(other, Program) and other.digest == self.digest
+
+    @classmethod
+    def parse(cls, body, digest=None):
+        """Parse and check program text (bytes). Raises ValueError if it is unusable."""
+        actual = hashlib.sha256(body).hexdigest()
+        if digest is not None and actual != digest:
+            raise ValueError("content hash mismatch")
+        data = json.loads(body)
+        fps = min(60, max(1, int(data.get("fps", 40))))
+        loops = min(MAX_LOOPS, max(1, int(data.get("loop", 1))))
+        keyframes = []
+        last = -1
+        for item in data["keyframes"][:MAX_KEYFRAMES]:
+            t = int(item[0])
+            if t <= last or t > MAX_DURATION_MS:
+                raise ValueError("keyframe times must increase and stay under 10s")
+            colors = tuple(str(c) for c in item[1]) or ("000000000",)
+            shift = float(item[2]) if len(item) > 2 else 0.0
+            ease = item[3] if len(item) > 3 else "linear"
+            keyframes.append((t, colors, shift, ease))
+            last = t
+        if len(keyframes) < 2:
+            raise ValueError("a program needs at least two keyframes")
+        return cls(actual, fps, loops, tuple(keyframes))
+
+
+class ProgramStore:
+    """
+    Animation programs by content hash: memory first, then disk, then the server.
+
+    get() never blocks on disk or the network. On a miss it starts a
+    background fetch and returns None, and the caller shows its fallback
+    animation; the program is there for the next tap. Fetched programs are
+    checked against their hash and kept in directory (oldest pruned past
+    max_programs), and the stored ones are loaded in the background at start.
+    """
+
+    def __init__(self, directory, http, path="/animations/{}", max_programs=256):
+        self.directory = directory
+        self.http = http
+        self.path = path
+        self.max_programs = max_programs
+        self.hits = 0
+        self.fetches = 0
+        self.failures = 0
+        self._programs = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="programs")
+        self._executor.submit(self._preload)
+
+    def get(self, digest):
+        """The program for digest, or None (a fetch is started if it isn't stored)."""
+        if not digest or not DIGEST.match(digest):
+            return None
+        with self._lock:
+            program = self._programs.get(digest)
+            if program is not None:
+                self._programs.move_to_end(digest)
+                self.hits += 1
+                return program
+            if digest in self._pending:
+                return None
+            self._pending.add(digest)
+        self._executor.submit(self._load, digest)
+        return None
+
+    def _file(self, digest):
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _remember(self, program):
+        with self._lock:
+            self._programs[program.digest] = program
+            while len(self._programs) > self.max_programs:
+                self._programs.popitem(last=False)
+
+    def _preload(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            digest = name[:-len(".json")]
+            if name.endswith(".json") and DIGEST.match(digest):
+                program = self._read_disk(digest)
+                if program is not None:
+                    self._remember(program)
+
+    def _load(self, digest):
+        try:
+            program = self._read_disk(digest) or self._fetch(digest)
+            if program is not None:
+                self._remember(program)
+        finally:
+            with self._lock:
+                self._pending.discard(digest)
+
+    def _read_disk(self, digest):
+        try:
+            with open(self._file(digest), "rb") as f:
+                return Program.parse(f.read(), digest)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+            logger.warning(f"Discarding stored program {digest[:12]}: {str(e)}")
+            try:
+                os.remove(self._file(digest))
+            except OSError:
+                pass
+            return None
+
+    def _fetch(self, digest):
+        self.fetches += 1
+        try:
+            response = self.http.get(self.path.format(digest), name="program")
+            response.raise_for_status()
+            program = Program.parse(response.content, digest)
+        except (RequestException, ValueError, KeyError, TypeError, IndexError) as e:
+            self.failures += 1
+            logger.error(f"Program {digest[:12]} fetch failed: {str(e)}")
+            return None
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{self._file(digest)}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(response.content)
+            os.replace(tmp, self._file(digest))
+            self._prune()
+        except OSError as e:
+            logger.error(f"Program {digest[:12]} not stored: {str(e)}")
+        logger.info(f"Fetched animation program {digest[:12]}")
+        return program
+
+    def _prune(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith(".json")]
+        if len(files) <= self.max_programs:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_programs]:
+            os.remove(path)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {"cached": len(self._programs), "hits": self.hits,
+                "fetches": self.fetches, "failures": self.failures}
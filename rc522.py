@@ -0,0 +1,110 @@
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF]
+DEFAULT_BLOCKS = (8, 9, 10)  # The blocks SimpleMFRC522 reads and writes
+
+
+def legacy_id(uid):
+    """The number SimpleMFRC522.read() returned for a card: its UID and check byte as one integer."""
+    bcc = 0
+    for byte in uid:
+        bcc ^= byte
+    n = 0
+    for byte in bytes(uid) + bytes([bcc]):
+        n = n * 256 + byte
+    return n
+
+
+class MFRC522Reader:
+    """
+    UID-only MFRC522 reader with the PN532 driver's polling interface.
+
+    A poll is just REQA and anticollision: enough for the UID, with no
+    select, authentication or block reads. read_passive_target() repeats
+    the poll until a card answers or the timeout passes, so PollingDetector
+    drives it the same way as a PN532. Data blocks are only read when
+    read_blocks() asks for them, and are cached per card.
+    """
+
+    def __init__(self, spi_bus=0, spi_device=0, pin_rst=25, poll_gap=0.01, cache_size=64):
+        import RPi.GPIO as GPIO
+        from mfrc522 import MFRC522
+
+        if GPIO.getmode() is None:
+            GPIO.setmode(GPIO.BCM)  # Same numbering as the IRQ and button pins
+        self.device = MFRC522(bus=spi_bus, device=spi_device, pin_rst=pin_rst)
+        self.poll_gap = poll_gap
+        self.cache_size = cache_size
+        self.polls = 0
+        self._serial = None  # Anticollision answer (UID + check byte) of the last card seen
+        self._blocks = OrderedDict()
+
+    def poll(self):
+        """One request/anticollision round. Returns the UID, or None if no card answered."""
+        d = self.device
+        self.polls += 1
+        status, _ = d.MFRC522_Request(d.PICC_REQIDL)
+        if status != d.MI_OK:
+            return None
+        status, serial = d.MFRC522_Anticoll()
+        if status != d.MI_OK:
+            return None
+        self._serial = serial
+        return bytes(serial[:4])
+
+    def read_passive_target(self, card_baud=0, timeout=1):
+        """Poll until a card answers or timeout seconds pass."""
+        deadline = time.monotonic() + timeout
+        while True:
+            uid = self.poll()
+            if uid is not None or time.monotonic() >= deadline:
+                return uid
+            time.sleep(self.poll_gap)
+
+    def read_blocks(self, uid, blocks=DEFAULT_BLOCKS, key=DEFAULT_KEY):
+        """
+        Data blocks of the card just polled, as bytes, or None if they can't be read.
+
+        Results are cached per UID, so only a card's first tap pays for the
+        select, authentication and reads. blocks must share a sector.
+        """
+        cache_key = (bytes(uid), tuple(blocks))
+        data = self._blocks.get(cache_key)
+        if data is not None:
+            self._blocks.move_to_end(cache_key)
+            return data
+
+        d = self.device
+        if self._serial is None or bytes(self._serial[:4]) != bytes(uid):
+            return None  # Only the card from the last poll is selectable
+        trailer = blocks[0] // 4 * 4 + 3
+        try:
+            d.MFRC522_SelectTag(self._serial)
+            if d.MFRC522_Auth(d.PICC_AUTHENT1A, trailer, key, self._serial) != d.MI_OK:
+                return None
+            data = bytearray()
+            for block in blocks:
+                chunk = d.MFRC522_Read(block)
+                if chunk is None:
+                    return None
+                data += bytes(chunk)
+        finally:
+            d.MFRC522_StopCrypto1()
+
+        data = bytes(data)
+        self._blocks[cache_key] = data
+        if len(self._blocks) > self.cache_size:
+            self._blocks.popitem(last=False)
+        return data
+
+    def forget(self, uid):
+        """Drop cached blocks for a card, e.g. after writing to it."""
+        for cache_key in [k for k in self._blocks if k[0] == bytes(uid)]:
+            del self._blocks[cache_key]
+
+    def close(self):
+        self.device.Close_MFRC522()
@@ -1,10 +1,14 @@
-import time
 import RPi.GPIO as GPIO
-from mfrc522 import SimpleMFRC522
 import requests
+from rc522 import MFRC522Reader, legacy_id
+from detect import PollingDetector
+from presence import PresenceTracker
 
 
-reader = SimpleMFRC522()
+# UID only: no authentication or block reads on a tap
+reader = MFRC522Reader()
+detector = PollingDetector(reader)
+presence = PresenceTracker()
 
 
 def control(color, duration, brightness):
@@ -32,12 +36,16 @@ def tap(card):
 def read(id):
     print(id)
     tap(id)
-    time.sleep(0.2)
 
 try:
     while True:
-        id, text = reader.read()
-        read(id)
+        uid = detector.wait_for_card(timeout=0.5)
+        if uid is None:
+            presence.absent()
+            continue
+        id = legacy_id(uid)  # Same card number SimpleMFRC522 reported
+        if presence.observe(id):
+            read(id)
     
 finally:
     GPIO.cleanup()
\ No newline at end of file
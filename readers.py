@@ -0,0 +1,68 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Reader:
+    """
+    One card reader on the controller.
+
+    Holds the reader's driver, detector, presence tracker and the renderer
+    for its LED segment (leds, or the whole ring), which the controller
+    attaches once the LEDs are up. start() runs a polling worker that hands each new
+    tap to dispatch(reader, card_id); everything past detection (HTTP,
+    caches, telemetry) is shared by all readers.
+    """
+
+    def __init__(self, name, device, driver, detector, presence, renderer=None, leds=None,
+                 read_timeout=0.5, card_id=bytes.hex):
+        self.name = name
+        self.device = device  # Device name reported to the server
+        self.driver = driver
+        self.detector = detector
+        self.presence = presence
+        self.renderer = renderer
+        self.leds = leds  # (first LED, count) of the reader's segment, or None
+        self.read_timeout = read_timeout
+        self.card_id = card_id  # UID bytes -> the card ID sent to the server
+        self._active = False
+        self._thread = None
+        self._dispatch = None
+
+    def start(self, dispatch):
+        self._dispatch = dispatch
+        self._active = True
+        self._thread = threading.Thread(target=self._poll, name=f"reader-{self.name}")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._active = False
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(self.read_timeout + 1)
+        self.detector.close()
+
+    def poll_once(self):
+        """Read the reader once. Returns the card ID if it is a new tap."""
+        uid = self.detector.wait_for_card(timeout=self.read_timeout)
+        if uid is None:
+            self.presence.absent()
+            return None
+        card_id = self.card_id(uid)
+        if not self.presence.observe(card_id):
+            return None  # Same card still on the reader
+        return card_id
+
+    def _poll(self):
+        while self._active:
+            try:
+                card_id = self.poll_once()
+            except Exception as e:
+                logger.error(f"Reader {self.name} poll error: {str(e)}")
+                continue
+            if card_id is not None:
+                self._dispatch(self, card_id)
+
+    def stats(self):
+        return {"detection": self.detector.stats(), "presence": self.presence.stats()}
@@ -0,0 +1,235 @@
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from frame_clock import FrameClock
+from frames import FrameCache
+
+logger = logging.getLogger(__name__)
+
+
+class LedRenderer:
+    """
+    Owns the NeoPixel ring and plays animation jobs on its own thread.
+
+    Jobs are queued with play(). A preempting job cuts off whatever is
+    playing and discards anything still queued, so the caller never waits
+    for an animation to finish. Animations are compiled once into raw frame
+    buffers (see frames.FrameCache) and played by copying them into the
+    NeoPixel buffer on the frame clock's deadlines (late frames are
+    dropped); a frame identical to the one already on the ring is not sent
+    again.
+    """
+
+    def __init__(self, pixels, cache_size=32, gamma=1.0):
+        self.pixels = pixels
+        self.cache = FrameCache(len(pixels), getattr(pixels, "byteorder", "GRB"), cache_size, gamma)
+        self._pre, self._post = _pixel_buffers(pixels)
+        self._scaled = np.frombuffer(self._post, dtype=np.uint8) if self._pre is not None else None
+        self._shown = None  # The frame on the ring
+        self.frames_shown = 0
+        self.frames_skipped = 0
+        self.clock = FrameClock()
+        self.lit = 0.0  # Channels at full scale in the frame on the ring (for load estimates)
+        self.observer = None  # Called with play()-to-first-frame latency
+        self._jobs = queue.Queue()
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._active = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="led-render")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=2):
+        """Cut off the current animation and stop the render thread."""
+        with self._cond:
+            self._generation += 1
+            self._drain()
+            self._cond.notify_all()
+        self._jobs.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.off()
+
+    def play(self, name, *params, preempt=True):
+        """Queue a compiled animation (see frames.COMPILERS). Returns immediately."""
+        with self._cond:
+            if preempt:
+                self._generation += 1
+                self._drain()
+                self._cond.notify_all()
+            self._jobs.put((self._generation, name, params, time.perf_counter()))
+
+    def _drain(self):
+        try:
+            while True:
+                self._jobs.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            generation, name, params, queued = job
+            with self._cond:
+                if generation != self._generation:
+                    continue  # Superseded while queued
+                self._active = generation
+            try:
+                frames = self.cache.get(name, *params)
+                if self.observer is not None:
+                    self.observer(time.perf_counter() - queued)
+                self._play(frames)
+            except Exception as e:
+                logger.error(f"Animation error: {str(e)}")
+
+    def _superseded(self):
+        return self._generation != self._active
+
+    def sleep(self, seconds):
+        """Wait between frames. Returns False if the job was cut off."""
+        with self._cond:
+            return not self._cond.wait_for(self._superseded, timeout=seconds)
+
+    def _blit(self, frame):
+        if frame == self._shown:
+            self.frames_skipped += 1
+            return
+        if self._pre is not None:
+            # Driver brightness below 1.0: keep its pre-brightness copy and
+            # scale the whole frame into the output buffer at once
+            self._pre[:] = frame
+            np.multiply(np.frombuffer(frame, dtype=np.uint8), self.pixels.brightness,
+                        out=self._scaled, casting="unsafe")
+        elif self._post is not None:
+            self._post[:] = frame
+        else:
+            rgb = np.frombuffer(frame, dtype=np.uint8).reshape(-1, 3)[:, [self.cache.order.index(c) for c in "RGB"]]
+            self.pixels[:] = rgb.tolist()
+        self.pixels.show()
+        self._shown = frame
+        self.frames_shown += 1
+        self.lit = sum(frame) / 255
+
+    def _play(self, frames):
+        """Copy compiled frames to the ring as the frame clock schedules them."""
+        for frame, wake_at in self.clock.plan(frames):
+            self._blit(frame)
+            if wake_at is not None and not self.sleep(wake_at - self.clock.now()):
+                return
+
+    @property
+    def frames_dropped(self):
+        return self.clock.dropped
+
+    def off(self):
+        """Turn off all LEDs straight away."""
+        self._blit(self.cache.get("off")[0][0])
+
+
+class PixelSegment:
+    """
+    A run of LEDs on a shared strip, for a LedRenderer of its own.
+
+    Writes go straight into the strip's buffer at the segment's offset;
+    show() pushes the whole strip, serialized with the other segments.
+    """
+
+    def __init__(self, pixels, start, count, lock):
+        self.pixels = pixels
+        self.start = start
+        self.count = count
+        self.byteorder = getattr(pixels, "byteorder", "GRB")
+        self._lock = lock
+        pre, post = _pixel_buffers(pixels)
+        window = slice(3 * start, 3 * (start + count))
+        self._pre_brightness_buffer = memoryview(pre)[window] if pre is not None else None
+        self._post_brightness_buffer = memoryview(post)[window] if post is not None else None
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def brightness(self):
+        return self.pixels.brightness
+
+    def __setitem__(self, index, color):
+        self.pixels[self.start + index] = color
+
+    def show(self):
+        with self._lock:
+            self.pixels.show()
+
+
+class RendererGroup:
+    """Segment renderers driven as one, for animations meant for every segment."""
+
+    def __init__(self, renderers):
+        self.renderers = list(renderers)
+
+    def start(self):
+        for renderer in self.renderers:
+            renderer.start()
+
+    def stop(self, timeout=2):
+        for renderer in self.renderers:
+            renderer.stop(timeout)
+
+    def play(self, name, *params, preempt=True):
+        for renderer in self.renderers:
+            renderer.play(name, *params, preempt=preempt)
+
+    def off(self):
+        for renderer in self.renderers:
+            renderer.off()
+
+    async def run(self):
+        import asyncio
+        await asyncio.gather(*(renderer.run() for renderer in self.renderers))
+
+    @property
+    def frames_shown(self):
+        return sum(renderer.frames_shown for renderer in self.renderers)
+
+    @property
+    def frames_skipped(self):
+        return sum(renderer.frames_skipped for renderer in self.renderers)
+
+    @property
+    def frames_dropped(self):
+        return sum(renderer.frames_dropped for renderer in self.renderers)
+
+    @property
+    def lit(self):
+        return sum(renderer.lit for renderer in self.renderers)
+
+    @property
+    def observer(self):
+        return self.renderers[0].observer
+
+    @observer.setter
+    def observer(self, observer):
+        for renderer in self.renderers:
+            renderer.observer = observer
+
+
+def _pixel_buffers(pixels):
+    """
+    The driver's raw (pre-brightness, output) buffers, or (None, None) if
+    we can't write them directly.
+
+    adafruit_pixelbuf only keeps a separate pre-brightness buffer when the
+    driver brightness isn't 1.0; otherwise the first one is None.
+    """
+    post = getattr(pixels, "_post_brightness_buffer", None)
+    if post is None:
+        return None, None
+    return getattr(pixels, "_pre_brightness_buffer", None), post
@@ -0,0 +1,64 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    """
+    Times the phases of bringing the device up.
+
+    Phases run inline with phase() or on a small pool with background().
+    Each phase's start (relative to t0, normally the start of the imports)
+    and duration are logged and kept for the startup metrics, along with
+    milestones such as the moment the first reader was polling.
+    """
+
+    def __init__(self, t0=None, workers=3):
+        self.t0 = t0 if t0 is not None else time.monotonic()
+        self.phases = {}  # name -> (start offset, duration) in seconds
+        self.milestones = {}  # name -> offset in seconds
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="startup")
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            took = time.monotonic() - start
+            self.phases[name] = (start - self.t0, took)
+            logger.info(f"Startup phase {name}: {took * 1000:.0f}ms (from +{(start - self.t0) * 1000:.0f}ms)")
+
+    def background(self, name, fn, *args):
+        """Run fn as a timed phase on the startup pool. Returns its future."""
+        def run():
+            with self.phase(name):
+                return fn(*args)
+        future = self._executor.submit(run)
+        self._futures.append(future)
+        return future
+
+    def mark(self, name):
+        self.milestones[name] = time.monotonic() - self.t0
+        logger.info(f"Startup: {name} at +{self.milestones[name] * 1000:.0f}ms")
+
+    def wait(self):
+        """Wait for the background phases. Re-raises the first one that failed."""
+        try:
+            for future in self._futures:
+                future.result()
+        except Exception:
+            self._executor.shutdown(wait=False)
+            raise
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        return {
+            "phases": {name: {"start_ms": round(start * 1000), "ms": round(took * 1000)}
+                       for name, (start, took) in self.phases.items()},
+            "milestones": {name: round(at * 1000) for name, at in self.milestones.items()},
+        }
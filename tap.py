@@ -5,8 +5,8 @@ import logging
 from digitalio import DigitalInOut
 from adafruit_pn532.i2c import PN532_I2C
 import neopixel
-import requests
 from requests.exceptions import RequestException
+from http_client import HttpClient
 
 # Configure logging
 logging.basicConfig(
@@ -21,7 +21,9 @@ CONFIG = {
     'LED_COUNT': 24,
     'SERVER_URL': 'http://127.0.0.1:8000/tap',
     'DEVICE_NAME': 'Entrance',
-    'REQUEST_TIMEOUT': 5,  # seconds
+    'REQUEST_TIMEOUT': 5,  # seconds (read)
+    'CONNECT_TIMEOUT': 2,
+    'KEEPALIVE_INTERVAL': 30,
 }
 
 class NFCRingController:
@@ -34,6 +36,13 @@ class NFCRingController:
             CONFIG['LED_COUNT'], 
             auto_write=False
         )
+        self.http = HttpClient(
+            CONFIG['SERVER_URL'],
+            connect_timeout=CONFIG['CONNECT_TIMEOUT'],
+            read_timeout=CONFIG['REQUEST_TIMEOUT'],
+            keepalive_interval=CONFIG['KEEPALIVE_INTERVAL']
+        )
+        self.http.start()
         
         # Verify PN532
         ic, ver, rev, support = self.pn532.firmware_version
@@ -87,11 +96,7 @@ class NFCRingController:
         }
         
         try:
-            response = requests.post(
-                CONFIG['SERVER_URL'],
-                json=data,
-                timeout=CONFIG['REQUEST_TIMEOUT']
-            )
+            response = self.http.post(json=data, name="tap")
             response.raise_for_status()
             
             response_data = response.json()
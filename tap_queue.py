@@ -0,0 +1,288 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from requests.exceptions import ConnectionError, HTTPError, RequestException
+
+from connectivity import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+def never_delivered(error):
+    """
+    True if a failed /tap can't have been recorded by the server, so it is
+    safe to replay: it was never sent (circuit open), the connection
+    failed, or the server answered 5xx. A read timeout or an unreadable
+    200 body means the server may well have the tap already; replaying it
+    would count it twice.
+    """
+    if isinstance(error, (CircuitOpenError, ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code >= 500
+
+
+def _boot_id():
+    """Identify this boot so monotonic timestamps from an earlier one are ignored."""
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+class OfflineTapQueue:
+    """
+    Crash-safe on-disk queue for taps the server never received.
+
+    put() only appends to an in-memory buffer, so the read loop never waits
+    on the SD card, and wakes the background thread when the buffer was
+    empty; it writes the buffer to SQLite (WAL mode) in one transaction
+    straight away, so a tap is only in memory for as long as that takes
+    (taps arriving meanwhile go in the next transaction). Every
+    flush_interval seconds, or when woken, it also replays stored taps in
+    batches to the bulk endpoint once the server answers again (not while
+    online() says it is down). on_wake, if set, is called alongside for a
+    runtime that drives step() itself. The table is capped at
+    max_rows; the oldest taps go first. A batch the server refuses outright
+    (a 4xx other than 408/429) would fail the same way forever, so it is
+    moved to the rejected table, also capped at max_rows, and replay
+    carries on with the next.
+    """
+
+    RETRY_STATUSES = (408, 429)
+
+    def __init__(self, path, http, device, bulk_path="/tap/bulk", batch_size=50,
+                 max_rows=10000, flush_interval=5, drain_interval=15, online=None):
+        self.path = path
+        self.http = http
+        self.device = device
+        self.bulk_path = bulk_path
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.drain_interval = drain_interval
+        self.online = online
+        self.on_wake = None  # Called from any thread when step() has work, e.g. by AsyncRuntime
+
+        self.boot_id = _boot_id()
+        self.stored = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.rejected = 0
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._active = False
+        self._thread = None
+        self._db = None
+        self._next_drain = 0.0
+
+    def start(self):
+        """Run the queue on its own thread (open/step/close drive it otherwise)."""
+        self._active = True
+        self._thread = threading.Thread(target=self._worker, name="offline-queue")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the worker, flushing anything still buffered to disk."""
+        self._active = False
+        self._wake.set()
+        if self._thread is not None:
+            if self._thread.is_alive():
+                self._thread.join()
+        else:
+            self.close()
+
+    def put(self, card_uid, device=None):
+        """Record a failed tap. Never touches the disk on the caller's thread."""
+        with self._lock:
+            first = not self._buffer
+            self._buffer.append((card_uid, time.time(), time.monotonic(), device))
+        if first:
+            self._notify()  # Otherwise a write is already on its way
+
+    def retry_now(self):
+        """Replay stored taps at the next step, e.g. when the server is back."""
+        self._next_drain = 0.0
+        self._notify()
+
+    def _notify(self):
+        self._wake.set()
+        if self.on_wake is not None:
+            self.on_wake()
+
+    def depth(self):
+        """Taps waiting to be replayed (on disk and still buffered)."""
+        with self._lock:
+            return self.stored + len(self._buffer)
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Only ever used by one thread at a time, but not always the one that opened it
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS taps ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " card TEXT NOT NULL,"
+            " wall REAL NOT NULL,"
+            " mono REAL NOT NULL,"
+            " boot TEXT NOT NULL)"
+        )
+        columns = [row[1] for row in db.execute("PRAGMA table_info(taps)")]
+        if "device" not in columns:
+            # Taps queued before multi-reader support belong to the default device
+            db.execute("ALTER TABLE taps ADD COLUMN device TEXT")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS rejected ("
+            " id INTEGER PRIMARY KEY,"
+            " card TEXT NOT NULL,"
+            " wall REAL NOT NULL,"
+            " mono REAL NOT NULL,"
+            " boot TEXT NOT NULL,"
+            " device TEXT,"
+            " status INTEGER)"
+        )
+        db.commit()
+        return db
+
+    def open(self):
+        """Open the database. Returns False if the queue can't be used."""
+        try:
+            self._db = self._connect()
+        except sqlite3.Error as e:
+            logger.error(f"Offline queue unavailable: {str(e)}")
+            return False
+        self._active = True
+        with self._lock:
+            self.stored = self._db.execute("SELECT COUNT(*) FROM taps").fetchone()[0]
+        if self.stored:
+            logger.info(f"{self.stored} offline taps waiting to be replayed")
+        return True
+
+    def step(self):
+        """Flush the buffer to disk and replay stored taps if a retry is due."""
+        self._flush(self._db)
+        if self.stored and time.monotonic() >= self._next_drain and (self.online is None or self.online()):
+            self._drain(self._db)
+
+    def close(self):
+        self._active = False
+        if self._db is not None:
+            self._flush(self._db)
+            self._db.close()
+            self._db = None
+
+    def _worker(self):
+        if not self.open():
+            return
+        while self._active:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.step()
+        self.close()
+
+    def _flush(self, db):
+        """Write buffered taps in a single transaction and enforce the row cap."""
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+        if not pending:
+            return
+        try:
+            with db:
+                db.executemany(
+                    "INSERT INTO taps (card, wall, mono, boot, device) VALUES (?, ?, ?, ?, ?)",
+                    [(card, wall, mono, self.boot_id, device) for card, wall, mono, device in pending]
+                )
+                count = db.execute("SELECT COUNT(*) FROM taps").fetchone()[0]
+                excess = count - self.max_rows
+                if excess > 0:
+                    db.execute(
+                        "DELETE FROM taps WHERE id IN (SELECT id FROM taps ORDER BY id LIMIT ?)",
+                        (excess,)
+                    )
+                    self.dropped += excess
+                    logger.warning(f"Offline queue full, dropped {excess} oldest taps")
+                    count = self.max_rows
+            with self._lock:
+                self.stored = count
+        except sqlite3.Error as e:
+            logger.error(f"Offline queue write failed: {str(e)}")
+            with self._lock:
+                self._buffer[:0] = pending
+
+    def _drain(self, db):
+        """Replay stored taps in batches until the queue is empty or a send fails."""
+        while self._active:
+            rows = db.execute(
+                "SELECT id, card, wall, mono, boot, device FROM taps ORDER BY id LIMIT ?",
+                (self.batch_size,)
+            ).fetchall()
+            if not rows:
+                return
+
+            # One device per request; other devices' taps go in the next batch
+            device = rows[0][5] or self.device
+            rows = [row for row in rows if (row[5] or self.device) == device]
+            now = time.monotonic()
+            taps = []
+            for _, card, wall, mono, boot, _ in rows:
+                tap = {"card": card, "tapped_at": wall}
+                if boot == self.boot_id:
+                    tap["age"] = round(now - mono, 3)  # Immune to wall-clock jumps
+                taps.append(tap)
+
+            try:
+                response = self.http.post(
+                    self.bulk_path,
+                    json={"device": device, "taps": taps},
+                    name="tap_bulk"
+                )
+                response.raise_for_status()
+            except HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status is None or not 400 <= status < 500 or status in self.RETRY_STATUSES:
+                    logger.warning(f"Offline replay failed, retrying later: {str(e)}")
+                    self._next_drain = time.monotonic() + self.drain_interval
+                    return
+                logger.error(f"Server refused {len(rows)} offline taps ({status}), set aside: {str(e)}")
+                self._reject(db, rows, status)
+                continue
+            except RequestException as e:
+                logger.warning(f"Offline replay failed, retrying later: {str(e)}")
+                self._next_drain = time.monotonic() + self.drain_interval
+                return
+
+            with db:
+                db.executemany("DELETE FROM taps WHERE id = ?", [(row[0],) for row in rows])
+            with self._lock:
+                self.stored = max(0, self.stored - len(rows))
+            self.replayed += len(rows)
+            logger.info(f"Replayed {len(rows)} offline taps")
+
+    def _reject(self, db, rows, status):
+        """Move rows the server will never accept out of the replay queue."""
+        ids = [(row[0],) for row in rows]
+        with db:
+            db.executemany(
+                "INSERT OR REPLACE INTO rejected (id, card, wall, mono, boot, device, status)"
+                " SELECT id, card, wall, mono, boot, device, ? FROM taps WHERE id = ?",
+                [(status, id_) for id_, in ids]
+            )
+            db.executemany("DELETE FROM taps WHERE id = ?", ids)
+            db.execute(
+                "DELETE FROM rejected WHERE id NOT IN (SELECT id FROM rejected ORDER BY id DESC LIMIT ?)",
+                (self.max_rows,)
+            )
+        with self._lock:
+            self.stored = max(0, self.stored - len(rows))
+        self.rejected += len(rows)
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+
+from requests.exceptions import RequestException
+
+logger = logging.getLogger(__name__)
+
+
+class Telemetry:
+    """
+    Device status sent to the server only when it is worth sending.
+
+    sources maps a field name to a function returning its current value.
+    A report becomes due when a field moves by at least its threshold
+    (fields without one, like uptime, never trigger a report on their own)
+    or when heartbeat seconds have passed since the last one. A due report
+    rides along on the next /tap request via attach(); if no tap comes
+    within piggyback_wait seconds, step() posts it on its own, unless
+    online() says the server is down.
+    """
+
+    def __init__(self, http, device, sources, thresholds=None, path="/telemetry",
+                 heartbeat=900, interval=15, piggyback_wait=30, online=None):
+        self.http = http
+        self.device = device
+        self.sources = sources
+        self.thresholds = thresholds or {}
+        self.path = path
+        self.heartbeat = heartbeat
+        self.interval = interval
+        self.piggyback_wait = piggyback_wait
+        self.online = online
+
+        self.sent_alone = 0
+        self.sent_with_tap = 0
+        self.last = None
+        self._last_sent = 0.0
+        self._due_since = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="telemetry")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.step()
+
+    def snapshot(self):
+        report = {}
+        for name, fn in self.sources.items():
+            try:
+                value = fn()
+            except Exception as e:
+                logger.debug(f"Telemetry source {name} failed: {str(e)}")
+                continue
+            if value is not None:
+                report[name] = round(value, 3) if isinstance(value, float) else value
+        return report
+
+    def _changed(self, report):
+        if self.last is None:
+            return True
+        for name, threshold in self.thresholds.items():
+            old, new = self.last.get(name), report.get(name)
+            if new is None:
+                continue
+            if old is None or abs(new - old) >= threshold:
+                return True
+        return False
+
+    def _check(self, now):
+        """Take a snapshot and mark a report due if it changed enough. Call with the lock held."""
+        report = self.snapshot()
+        if self._due_since is None and (self._changed(report) or now - self._last_sent >= self.heartbeat):
+            self._due_since = now
+        return report
+
+    def attach(self):
+        """The report to piggyback on a tap request, or None if nothing is due."""
+        with self._lock:
+            report = self._check(time.monotonic())
+            return report if self._due_since is not None else None
+
+    def sent(self, report, with_tap=True):
+        """Record that report reached the server."""
+        with self._lock:
+            self.last = report
+            self._last_sent = time.monotonic()
+            self._due_since = None
+            if with_tap:
+                self.sent_with_tap += 1
+            else:
+                self.sent_alone += 1
+
+    def step(self):
+        """Post a due report that no tap has picked up in time."""
+        with self._lock:
+            now = time.monotonic()
+            report = self._check(now)
+            if self._due_since is None or now - self._due_since < self.piggyback_wait:
+                return
+        if self.online is not None and not self.online():
+            return  # Still due; sent once the server is back
+        try:
+            response = self.http.post(self.path, json={"device": self.device, "telemetry": report},
+                                      name="telemetry")
+            response.raise_for_status()
+        except RequestException as e:
+            logger.error(f"Failed to send telemetry: {str(e)}")
+            return
+        self.sent(report, with_tap=False)
+        logger.info(f"Telemetry sent: {report}")
+
+    def stats(self):
+        return {"sent_alone": self.sent_alone, "sent_with_tap": self.sent_with_tap, "last": self.last}
@@ -0,0 +1,110 @@
+import pytest
+import requests
+from requests.exceptions import ConnectionError, HTTPError
+
+import connectivity
+from connectivity import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(connectivity.time, "monotonic", clock)
+    return clock
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return HTTPError(f"{status}", response=response)
+
+
+def test_opens_after_threshold_outages_in_a_row(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record(ConnectionError())
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(http_error(503))
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 1
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record(ConnectionError())
+    breaker.record()
+    breaker.record(ConnectionError())
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_errors_mean_the_server_is_up(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record(http_error(404))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record(ConnectionError())
+    clock.now += 4.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_trial_success_closes_and_failure_reopens(clock):
+    states = []
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.listeners.append(states.append)
+    breaker.record(ConnectionError())
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record(ConnectionError())
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 2
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert states == [CircuitBreaker.OPEN, CircuitBreaker.OPEN, CircuitBreaker.CLOSED]
+
+
+def test_guard_refuses_while_open(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(ConnectionError):
+        with breaker.guard():
+            raise ConnectionError()
+    with pytest.raises(CircuitOpenError):
+        with breaker.guard():
+            pass
+
+
+def test_guard_frees_the_trial_on_other_errors(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5)
+    breaker.record(ConnectionError())
+    clock.now += 5
+    with pytest.raises(KeyError):
+        with breaker.guard():
+            raise KeyError("parse")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with breaker.guard():
+        pass
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_listener_errors_are_contained(clock):
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.listeners.append(lambda state: 1 / 0)
+    breaker.record(ConnectionError())
+    assert breaker.state == CircuitBreaker.OPEN
@@ -0,0 +1,97 @@
+import time
+
+from detect import IrqDetector, PollingDetector
+
+
+class FakeReader:
+    """A PN532 whose IRQ line is low whenever it is listening and a card is in the field."""
+
+    def __init__(self):
+        self.card = None
+        self.listening = False
+        self.reads = 0
+
+    def read_passive_target(self, timeout=1):
+        self.reads += 1
+        return self.card
+
+    def listen_for_passive_target(self, timeout=1):
+        self.listening = True
+        return True
+
+    def get_passive_target(self, timeout=1):
+        self.reads += 1
+        self.listening = False
+        return self.card
+
+
+class FakeGpio:
+    def __init__(self, reader):
+        self.reader = reader
+
+    def input(self, pin):
+        return 0 if self.reader.listening and self.reader.card is not None else 1
+
+
+class FakeEvents:
+    def __init__(self, gpio):
+        self.gpio = gpio
+        self.watched = {}
+
+    def watch(self, pin, callback, pull_up=True):
+        self.watched[pin] = callback
+
+
+def hold(detector, seconds):
+    """Run the detector's loop for seconds; return the UIDs it reported."""
+    uids = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        uids.append(detector.wait_for_card(timeout=0.01))
+    return uids
+
+
+def irq_detector(reader, max_interval=0.05):
+    return IrqDetector(reader, 25, FakeEvents(FakeGpio(reader)), max_interval=max_interval)
+
+
+def test_irq_held_card_is_read_at_max_interval():
+    reader = FakeReader()
+    detector = irq_detector(reader)
+    reader.card = b"\x01\x02\x03\x04"
+    uids = hold(detector, 0.3)
+    assert set(uids) == {reader.card}
+    assert reader.reads <= 8  # Back-to-back reads would be in the thousands
+    assert detector.stats()["count"] == 1
+
+
+def test_irq_goes_back_to_waiting_once_the_card_leaves():
+    reader = FakeReader()
+    detector = irq_detector(reader)
+    reader.card = b"\x01\x02\x03\x04"
+    assert detector.read(timeout=0.01) == reader.card
+    assert detector.next_interval() == 0.05
+    reader.card = None
+    assert detector.read(timeout=0.01) is None
+    assert detector.next_interval() == 0.0
+
+
+def test_irq_new_card_after_a_held_one_is_recorded():
+    reader = FakeReader()
+    detector = irq_detector(reader)
+    reader.card = b"\x01"
+    detector.read(timeout=0.01)
+    reader.card = b"\x02"
+    assert detector.read(timeout=0.01) == b"\x02"
+    assert detector.stats()["count"] == 2
+
+
+def test_polling_held_card_is_read_at_max_interval():
+    reader = FakeReader()
+    detector = PollingDetector(reader, min_interval=0.0, max_interval=0.05)
+    reader.card = b"\x01\x02\x03\x04"
+    hold(detector, 0.3)
+    assert reader.reads <= 8
+    reader.card = None
+    assert detector.read() is None
+    assert detector.next_interval() == 0.0
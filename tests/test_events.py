@@ -0,0 +1,35 @@
+import pytest
+
+from events import EventBus
+
+
+class FakeGpio:
+    BCM = IN = PUD_UP = PUD_DOWN = BOTH = 0
+
+    def __init__(self):
+        self.detecting = []
+
+    def setmode(self, mode):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=None):
+        pass
+
+    def add_event_detect(self, pin, edge, callback=None):
+        self.detecting.append(pin)
+
+
+@pytest.mark.parametrize("pin", [2, 3])
+def test_i2c_pins_are_refused(pin):
+    gpio = FakeGpio()
+    bus = EventBus(gpio)
+    with pytest.raises(RuntimeError, match="I2C"):
+        bus.add_button("shutdown", pin)
+    assert gpio.detecting == []
+
+
+def test_free_pin_is_watched():
+    gpio = FakeGpio()
+    bus = EventBus(gpio)
+    bus.add_button("shutdown", 26)
+    assert gpio.detecting == [26]
@@ -0,0 +1,64 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_client import HttpClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(0.5)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def timed_while_busy(client, holder):
+    """Time a GET made while holder has a slow GET in flight."""
+    slow = threading.Thread(target=holder.get, args=("/slow",))
+    slow.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    client.get("/fast")
+    elapsed = time.monotonic() - start
+    slow.join()
+    return elapsed
+
+
+def test_tap_client_never_waits_for_a_busy_pool(server):
+    client = HttpClient(server, pool_size=1)
+    try:
+        assert timed_while_busy(client, client) < 0.3
+    finally:
+        client.close()
+
+
+def test_background_calls_use_their_own_pool(server):
+    client = HttpClient(server, pool_size=1)
+    background = client.background(pool_size=1)
+    try:
+        assert background.session is not client.session
+        assert timed_while_busy(client, background) < 0.3
+        # Background callers do queue for their own sockets
+        assert timed_while_busy(background, background) >= 0.3
+    finally:
+        background.close()
+        client.close()
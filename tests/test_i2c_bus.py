@@ -0,0 +1,90 @@
+import threading
+import time
+
+from i2c_bus import BusArbiter
+
+
+def waiting(bus, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while len(bus._waiting) < count:
+        assert time.monotonic() < deadline, "claims never queued"
+        time.sleep(0.001)
+
+
+def claim_in_thread(bus, name, order):
+    def run():
+        with bus.claim(name):
+            order.append(name)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_released_bus_goes_to_the_reader_first():
+    bus = BusArbiter(max_defer=10)
+    order = []
+    with bus.claim("nfc"):
+        threads = [claim_in_thread(bus, "battery", order)]
+        waiting(bus, 1)
+        threads.append(claim_in_thread(bus, "nfc", order))
+        waiting(bus, 2)
+    for thread in threads:
+        thread.join()
+    assert order == ["nfc", "battery"]
+
+
+def test_claim_deferred_past_max_defer_goes_next():
+    bus = BusArbiter(max_defer=0.05)
+    order = []
+    with bus.claim("nfc"):
+        threads = [claim_in_thread(bus, "battery", order)]
+        waiting(bus, 1)
+        threads.append(claim_in_thread(bus, "nfc", order))
+        waiting(bus, 2)
+        time.sleep(0.1)
+    for thread in threads:
+        thread.join()
+    assert order == ["battery", "nfc"]
+
+
+def test_unknown_devices_rank_last():
+    bus = BusArbiter(max_defer=10)
+    order = []
+    with bus.claim("nfc"):
+        threads = [claim_in_thread(bus, "sensor", order)]
+        waiting(bus, 1)
+        threads.append(claim_in_thread(bus, "battery", order))
+        waiting(bus, 2)
+    for thread in threads:
+        thread.join()
+    assert order == ["battery", "sensor"]
+
+
+def test_contended_claims_are_counted():
+    bus = BusArbiter()
+    waits = []
+    bus.observer = lambda name, waited: waits.append(name)
+    with bus.claim("battery"):
+        pass
+    assert bus.contended("battery") == 0
+    order = []
+    with bus.claim("nfc"):
+        thread = claim_in_thread(bus, "battery", order)
+        waiting(bus, 1)
+    thread.join()
+    assert bus.contended("battery") == 1
+    assert bus.stats()["battery"]["claims"] == 2
+    assert waits == ["battery", "nfc", "battery"]
+
+
+def test_shared_device_holds_the_bus_per_call():
+    bus = BusArbiter()
+
+    class Device:
+        def read(self):
+            return bus._owner
+
+    shared = bus.wrap(Device(), "nfc")
+    assert shared.read() == "nfc"
+    assert bus._owner is None
@@ -0,0 +1,51 @@
+from presence import PresenceTracker
+
+
+def test_first_read_is_a_tap():
+    tracker = PresenceTracker()
+    assert tracker.observe("a", now=0.0)
+    assert tracker.present == "a"
+
+
+def test_card_left_on_the_reader_is_one_tap():
+    tracker = PresenceTracker(hold_window=1.0)
+    assert tracker.observe("a", now=0.0)
+    for i in range(1, 20):
+        assert not tracker.observe("a", now=i * 0.5)
+    assert tracker.stats() == {"taps": 1, "suppressed": 19}
+
+
+def test_gap_longer_than_hold_window_is_a_new_tap():
+    tracker = PresenceTracker(hold_window=1.0)
+    tracker.observe("a", now=0.0)
+    assert tracker.observe("a", now=1.5)
+
+
+def test_flicker_after_removal_is_not_a_tap():
+    tracker = PresenceTracker(hold_window=1.0, retap_window=0.5)
+    tracker.observe("a", now=0.0)
+    tracker.absent()
+    assert tracker.present is None
+    assert not tracker.observe("a", now=0.3)
+
+
+def test_retap_after_removal_counts():
+    tracker = PresenceTracker(hold_window=1.0, retap_window=0.5)
+    tracker.observe("a", now=0.0)
+    tracker.absent()
+    assert tracker.observe("a", now=0.8)
+
+
+def test_another_card_is_a_tap_straight_away():
+    tracker = PresenceTracker()
+    tracker.observe("a", now=0.0)
+    assert tracker.observe("b", now=0.1)
+    assert tracker.present == "b"
+
+
+def test_old_uids_are_forgotten():
+    tracker = PresenceTracker(hold_window=1.0, retap_window=0.5)
+    for i in range(300):
+        tracker.observe(f"{i:08x}", now=i * 0.01)
+    assert len(tracker._last_seen) < 300
+    assert tracker.observe("00000000", now=10.0)
@@ -0,0 +1,215 @@
+import sqlite3
+import time
+
+import pytest
+import requests
+from requests.exceptions import ConnectionError, ConnectTimeout, HTTPError, JSONDecodeError, ReadTimeout
+
+from connectivity import CircuitOpenError
+from tap_queue import OfflineTapQueue, never_delivered
+
+
+class FakeHttp:
+    """Answers bulk posts with the given statuses in turn (200 once they run out)."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.posts = []
+
+    def post(self, path, json=None, name=None):
+        self.posts.append(json)
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status is None:
+            raise ConnectionError("unreachable")
+        response = requests.Response()
+        response.status_code = status
+        return response
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(http=None, **kwargs):
+        queue = OfflineTapQueue(str(tmp_path / "taps.db"), http or FakeHttp(), "door", **kwargs)
+        assert queue.open()
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def cards(posts):
+    return [tap["card"] for post in posts for tap in post["taps"]]
+
+
+def test_put_stays_in_memory_until_step(make_queue):
+    http = FakeHttp(None)
+    queue = make_queue(http)
+    queue.put("a")
+    assert queue.depth() == 1
+    assert queue.stored == 0
+    queue.step()
+    assert queue.stored == 1
+
+
+def test_worker_writes_a_tap_straight_away(tmp_path):
+    queue = OfflineTapQueue(str(tmp_path / "taps.db"), FakeHttp(None), "door", flush_interval=60)
+    queue.start()
+    try:
+        queue.put("a")
+        deadline = time.monotonic() + 2
+        while queue.stored < 1:
+            assert time.monotonic() < deadline, "tap still only in memory"
+            time.sleep(0.01)
+        # Already on disk for anyone else, e.g. after a power cut
+        db = sqlite3.connect(str(tmp_path / "taps.db"))
+        assert db.execute("SELECT card FROM taps").fetchall() == [("a",)]
+        db.close()
+    finally:
+        queue.stop()
+
+
+def test_on_wake_is_called_once_per_write(make_queue):
+    queue = make_queue()
+    woken = []
+    queue.on_wake = lambda: woken.append(queue.depth())
+    queue.put("a")
+    queue.put("b")
+    assert woken == [1]
+    queue.step()
+    queue.put("c")
+    assert woken == [1, 1]
+
+
+def test_taps_survive_a_restart(make_queue):
+    queue = make_queue(FakeHttp(None))
+    queue.put("a")
+    queue.put("b")
+    queue.close()
+    assert make_queue(online=lambda: False).depth() == 2
+
+
+def test_cap_drops_the_oldest(make_queue):
+    http = FakeHttp()
+    queue = make_queue(http, max_rows=3, online=lambda: False)
+    for card in "abcde":
+        queue.put(card)
+    queue.step()
+    assert queue.stored == 3
+    assert queue.dropped == 2
+    queue.online = None
+    queue.step()
+    assert cards(http.posts) == ["c", "d", "e"]
+
+
+def test_replay_in_batches_in_order(make_queue):
+    http = FakeHttp()
+    queue = make_queue(http, batch_size=2)
+    for card in "abcde":
+        queue.put(card)
+    queue.step()
+    assert [len(post["taps"]) for post in http.posts] == [2, 2, 1]
+    assert cards(http.posts) == list("abcde")
+    assert queue.replayed == 5
+    assert queue.depth() == 0
+
+
+def test_one_device_per_batch(make_queue):
+    http = FakeHttp()
+    queue = make_queue(http)
+    queue.put("a")
+    queue.put("b", "gate")
+    queue.put("c")
+    queue.step()
+    assert [(post["device"], [tap["card"] for tap in post["taps"]]) for post in http.posts] == [
+        ("door", ["a", "c"]), ("gate", ["b"])
+    ]
+
+
+def test_outage_keeps_taps_and_backs_off(make_queue):
+    http = FakeHttp(None, 503)
+    queue = make_queue(http, drain_interval=60)
+    queue.put("a")
+    queue.step()
+    assert queue.stored == 1
+    queue.step()
+    assert len(http.posts) == 1  # Backing off
+    queue.retry_now()
+    queue.step()
+    assert queue.stored == 1
+    queue.retry_now()
+    queue.step()
+    assert queue.stored == 0
+    assert queue.replayed == 1
+
+
+@pytest.mark.parametrize("status", [408, 429])
+def test_throttling_is_retried(make_queue, status):
+    queue = make_queue(FakeHttp(status))
+    queue.put("a")
+    queue.step()
+    assert queue.stored == 1
+    assert queue.rejected == 0
+
+
+def test_refused_batch_is_set_aside(make_queue):
+    http = FakeHttp(400)
+    queue = make_queue(http, batch_size=2)
+    for card in "abc":
+        queue.put(card)
+    queue.step()
+    assert queue.rejected == 2
+    assert queue.replayed == 1
+    assert queue.depth() == 0
+    rows = queue._db.execute("SELECT card, status FROM rejected ORDER BY id").fetchall()
+    assert rows == [("a", 400), ("b", 400)]
+
+
+def test_no_replay_while_offline(make_queue):
+    online = [False]
+    http = FakeHttp()
+    queue = make_queue(http, online=lambda: online[0])
+    queue.put("a")
+    queue.step()
+    assert http.posts == []
+    online[0] = True
+    queue.step()
+    assert queue.replayed == 1
+
+
+def test_age_only_for_taps_from_this_boot(make_queue):
+    http = FakeHttp(None)
+    queue = make_queue(http)
+    queue.put("a")
+    queue.step()
+    queue._db.execute("UPDATE taps SET boot = 'earlier'")
+    queue.put("b")
+    queue.retry_now()
+    http.statuses = []
+    queue.step()
+    taps = http.posts[-1]["taps"]
+    assert "age" not in taps[0]
+    assert "age" in taps[1]
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return HTTPError(f"{status}", response=response)
+
+
+@pytest.mark.parametrize("error", [
+    CircuitOpenError("open"), ConnectionError("refused"), ConnectTimeout("connect"), http_error(503),
+])
+def test_taps_the_server_never_saw_are_replayed(error):
+    assert never_delivered(error)
+
+
+@pytest.mark.parametrize("error", [
+    ReadTimeout("read"), JSONDecodeError("Expecting value", "<html>", 0), http_error(404),
+])
+def test_taps_the_server_may_have_are_not(error):
+    assert not never_delivered(error)